@@ -0,0 +1,444 @@
+# ==============================================================================
+# benchmark suite
+# ==============================================================================
+# times the rendering and game hot paths of pumpkin.py without anyone sitting at the screen.
+#
+#   python benchmark.py                       small psychopy window without vsync, needs a display
+#                                             (software GL like Mesa is fine, xvfb-run on a box without one)
+#   python benchmark.py --backend recording   no GL and no display at all, psychopy is replaced by a recorder
+#   python benchmark.py --save-baseline       store the results as the baseline of that backend
+#
+# every run is compared against the saved baseline of its backend in benchmarks/
+import argparse
+import functools
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+import numpy
+
+baseline_directory = "benchmarks"
+
+# ==============================================================================
+# recording psychopy
+# ==============================================================================
+named_colors = {
+    "black":  (0, 0, 0),       "white":  (255, 255, 255), "gray":   (128, 128, 128),
+    "orange": (255, 165, 0),   "yellow": (255, 255, 0),   "green":  (0, 128, 0),
+    "blue":   (0, 0, 255),     "red":    (255, 0, 0),     "purple": (128, 0, 128),
+    "brown":  (165, 42, 42),   "lime":   (0, 255, 0)
+}
+
+def install_recording_psychopy():
+    # a stand-in for the parts of psychopy that pumpkin.py uses. stimuli keep whatever is set on
+    # them and draw() only gets counted, so what's left to time is the game's own python code
+    class MinimalStim:
+        def __init__(self, win=None, **kwargs):
+            self.win = win
+            self.__dict__.update(kwargs)
+
+        def draw(self):
+            pass
+
+    class RecordedImage:
+        def convert(self, mode):
+            return numpy.zeros((64, 64, 3), dtype=numpy.uint8)
+
+    class BufferImageStim(MinimalStim):
+        def __init__(self, win=None, stim=(), **kwargs):
+            super().__init__(win, **kwargs)
+            for part in stim:
+                part.draw()
+            self.image = RecordedImage()
+
+    stim_classes = {name: type(name, (MinimalStim,), {}) for name in
+                    ["TextStim", "Rect", "Line", "Polygon", "ShapeStim", "ImageStim", "ElementArrayStim"]}
+
+    class Window:
+        def __init__(self, size=(800, 600), **kwargs):
+            self.size = size
+            self.winHandle = types.SimpleNamespace() # no key events, pumpkin falls back to event.getKeys()
+            self.flip_callbacks = []
+
+        def flip(self, clearBuffer=True):
+            callbacks, self.flip_callbacks = self.flip_callbacks, []
+            for function, args, kwargs in callbacks:
+                function(*args, **kwargs)
+            return time.perf_counter()
+
+        def callOnFlip(self, function, *args, **kwargs):
+            self.flip_callbacks.append((function, args, kwargs))
+
+        def clearBuffer(self):
+            pass
+
+        def getActualFrameRate(self, **kwargs):
+            return 60.0
+
+        def close(self):
+            pass
+
+    class Clock:
+        def __init__(self):
+            self.start = time.perf_counter()
+
+        def getTime(self):
+            return time.perf_counter() - self.start
+
+        def reset(self):
+            self.start = time.perf_counter()
+
+    class Mouse:
+        def getPressed(self):
+            return [0, 0, 0]
+
+        def getPos(self):
+            return (0.0, 0.0)
+
+    class Sound:
+        def __init__(self, value=None, **kwargs):
+            self.value = value
+
+        def play(self):
+            pass
+
+        def stop(self):
+            pass
+
+    class Color:
+        def __init__(self, value):
+            if value.startswith("#"):
+                rgb255 = [int(value[i:i + 2], 16) for i in (1, 3, 5)]
+            else:
+                rgb255 = named_colors.get(value, (0, 0, 0))
+            self.rgb = numpy.array(rgb255) / 127.5 - 1 # psychopy's -1..1 rgb
+
+    def getKeys(keyList=None, timeStamped=False):
+        return []
+
+    def quit():
+        sys.exit(0)
+
+    modules = {}
+    def module(name, **attributes):
+        modules[name] = types.ModuleType(name)
+        modules[name].__dict__.update(attributes)
+        return modules[name]
+
+    basevisual = module("psychopy.visual.basevisual", MinimalStim=MinimalStim)
+    shape      = module("psychopy.visual.shape", BaseShapeStim=type("BaseShapeStim", (MinimalStim,), {}))
+    visual     = module("psychopy.visual", Window=Window, BufferImageStim=BufferImageStim, basevisual=basevisual, shape=shape, **stim_classes)
+    core       = module("psychopy.core", getTime=time.perf_counter, Clock=Clock, wait=time.sleep, quit=quit)
+    event      = module("psychopy.event", getKeys=getKeys, clearEvents=lambda *args, **kwargs: None, Mouse=Mouse,
+                        globalKeys=types.SimpleNamespace(add=lambda **kwargs: None))
+    sound      = module("psychopy.sound", Sound=Sound)
+    colors     = module("psychopy.colors", Color=Color)
+    module("psychopy", visual=visual, core=core, event=event, sound=sound, colors=colors)
+    sys.modules.update(modules)
+
+# ==============================================================================
+# draw call counting
+# ==============================================================================
+def count_draw_calls(minimal_stim):
+    # wraps draw() of every stimulus class, a draw() that calls its parent class's draw() counts once
+    counter = {"draws": 0, "depth": 0}
+
+    def wrap(draw):
+        @functools.wraps(draw)
+        def counting_draw(self, *args, **kwargs):
+            counter["depth"] += 1
+            try:
+                return draw(self, *args, **kwargs)
+            finally:
+                counter["depth"] -= 1
+                if counter["depth"] == 0:
+                    counter["draws"] += 1
+        return counting_draw
+
+    classes = [minimal_stim]
+    wrapped = set()
+    while classes:
+        stim_class = classes.pop()
+        if stim_class in wrapped:
+            continue
+        wrapped.add(stim_class)
+        if "draw" in stim_class.__dict__:
+            stim_class.draw = wrap(stim_class.__dict__["draw"])
+        classes.extend(stim_class.__subclasses__())
+    return counter
+
+# ==============================================================================
+# scripted input & frames
+# ==============================================================================
+# the frame loops in pumpkin.py run until a key says otherwise, so the benchmark plays keys
+# and mouse clicks into them and presses escape (then space) after the wanted number of frames
+frames = {
+    "presented": 0, # frames presented in the current run
+    "limit": 0,     # escape from this frame on
+    "tick": None,   # called once per frame while frames count as benchmark operations
+    "keys": lambda frame: []
+}
+
+def create_scripted_event(real_event):
+    def getKeys(keyList=None, timeStamped=False):
+        if frames["presented"] >= frames["limit"]:
+            keys = ["escape", "space"]
+        else:
+            keys = frames["keys"](frames["presented"])
+        keys = [key for key in keys if keyList is None or key in keyList]
+        return [(key, time.perf_counter()) for key in keys] if timeStamped else keys
+
+    class Mouse:
+        # clicks on a random spot every third frame
+        def getPressed(self):
+            return [int(frames["presented"] % 3 == 0), 0, 0]
+
+        def getPos(self):
+            return (random.uniform(-0.8, 0.8), random.uniform(-0.8, 0.8))
+
+    return types.SimpleNamespace(getKeys=getKeys, Mouse=Mouse, clearEvents=lambda *args, **kwargs: None,
+                                 globalKeys=real_event.globalKeys)
+
+def install_frame_counter(game):
+    present_frame = game.present_frame
+
+    @functools.wraps(present_frame)
+    def counting_present_frame(screen):
+        present_frame(screen)
+        frames["presented"] += 1
+        if frames["tick"] is not None and frames["presented"] <= frames["limit"]:
+            frames["tick"]()
+    game.present_frame = counting_present_frame
+
+    # an idle frame (present_scene had nothing new to draw) counts too, without the sleep
+    def counting_wait_for_input(timeout):
+        frames["presented"] += 1
+        if frames["tick"] is not None and frames["presented"] <= frames["limit"]:
+            frames["tick"]()
+    game.wait_for_input = counting_wait_for_input
+
+def run_frames(count, tick, keys=lambda frame: []):
+    # sets up a frame loop run of count frames, each one calling tick
+    frames["presented"] = 0
+    frames["limit"] = count
+    frames["tick"] = tick
+    frames["keys"] = keys
+
+class FrameClock:
+    # a clock that moves 1/60 s per frame, so time based animations play at full speed
+    def __init__(self):
+        self.time = 0.0
+
+    def getTime(self):
+        return self.time
+
+    def advance(self):
+        self.time += 1 / 60.0
+
+# ==============================================================================
+# cases
+# ==============================================================================
+# every case gets (count, tick) and calls tick() once per operation
+def create_cases(game):
+    def create_pumpkin(count, tick):
+        for i in range(count):
+            game.create_pumpkin(0.0, 0.0)
+            tick()
+
+    def set_pumpkin_scale(count, tick):
+        pumpkin = game.create_pumpkin(0.0, 0.0)
+        for i in range(count):
+            game.set_pumpkin_scale(pumpkin, 1.0 + (i % 2) * 0.5)
+            tick()
+
+    def update_pumpkin_position(count, tick):
+        pumpkin = game.create_pumpkin(0.0, 0.0)
+        for i in range(count):
+            game.update_pumpkin_position(pumpkin, (i % 2) * 0.5, 0.0)
+            tick()
+
+    def draw_pumpkin(count, tick):
+        pumpkin = game.create_pumpkin(0.0, 0.0)
+        for i in range(count):
+            game.draw_pumpkin(pumpkin)
+            tick()
+        game.window.flip()
+
+    def draw_moving_pumpkin(count, tick):
+        pumpkin = game.create_pumpkin(0.0, 0.0)
+        for i in range(count):
+            game.update_pumpkin_position(pumpkin, (i % 100) / 100.0, 0.0)
+            game.set_pumpkin_rotation(pumpkin, i % 360)
+            game.draw_pumpkin(pumpkin)
+            tick()
+        game.window.flip()
+
+    def draw_sprite_pumpkin(count, tick):
+        pumpkin = game.create_pumpkin(0.0, 0.0, sprite=True)
+        game.warm_pumpkin_sprite(pumpkin)
+        for i in range(count):
+            game.update_pumpkin_position(pumpkin, (i % 100) / 100.0, 0.0)
+            game.draw_pumpkin(pumpkin)
+            tick()
+        game.window.flip()
+
+    def skin_store_frame(count, tick):
+        # scrolls and switches parts every few frames so the carousel really changes
+        script = ["right", "right", "left", "down", "right", "up"]
+        run_frames(count, tick, keys=lambda frame: [script[frame // 5 % len(script)]] if frame % 5 == 0 else [])
+        game.run_screen("skin_store")
+        game.thumbnail_worker["requests"].join() # the thumbnail worker would still be busy during the next case
+
+    def idle_skin_store_frame(count, tick):
+        # nobody touches the store: the steady state, allocations per frame should be near zero
+        run_frames(count, tick)
+        game.run_screen("skin_store")
+        game.thumbnail_worker["requests"].join()
+
+    def squash_frame(difficulty):
+        def squash(count, tick):
+            run_frames(count, tick)
+            game.run_screen("squash", difficulty=difficulty, total_game_time=3600)
+        return squash
+
+    def game_over_animation(count, tick):
+        # the whole animation, 80 frames, with a clock that moves one frame per frame
+        frames["tick"] = None
+        for i in range(count):
+            game_over = game.create_game_over_animation()
+            clock = FrameClock()
+            game_over["animation"]["clock"] = clock
+            while game.draw_game_over_animation(game_over):
+                game.present_frame("benchmark")
+                clock.advance()
+            tick()
+
+    return [
+        ("create_pumpkin",           create_pumpkin,          200),
+        ("set_pumpkin_scale",        set_pumpkin_scale,       100_000),
+        ("update_pumpkin_position",  update_pumpkin_position, 100_000),
+        ("draw_pumpkin",             draw_pumpkin,            2_000),
+        ("draw_pumpkin (moving)",    draw_moving_pumpkin,     2_000),
+        ("draw_pumpkin (sprite)",    draw_sprite_pumpkin,     2_000),
+        ("skin_store frame",         skin_store_frame,        300),
+        ("skin_store frame (idle)",  idle_skin_store_frame,   300),
+        ("squash frame (easy)",      squash_frame(0),         300),
+        ("squash frame (medium)",    squash_frame(1),         300),
+        ("squash frame (hard)",      squash_frame(2),         300),
+        ("game_over_animation",      game_over_animation,     5)
+    ]
+
+# ==============================================================================
+# measuring
+# ==============================================================================
+def measure(case, count, draw_counter):
+    # one timed run, then one run under tracemalloc for the allocations
+    case(max(1, count // 10), lambda: None) # warm up: background layers, sprites, caches
+
+    operations = {"count": 0}
+    def timing_tick():
+        operations["count"] += 1
+
+    gc.collect()
+    draws_before = draw_counter["draws"]
+    start_time = time.perf_counter()
+    case(count, timing_tick)
+    elapsed = time.perf_counter() - start_time
+    draws = draw_counter["draws"] - draws_before
+    timed_operations = operations["count"]
+
+    # bytes allocated per operation: how far memory peaked above where each operation started
+    allocation = {"bytes": 0, "start": 0}
+    def allocation_tick():
+        operations["count"] += 1
+        allocation["bytes"] += tracemalloc.get_traced_memory()[1] - allocation["start"]
+        tracemalloc.reset_peak()
+        allocation["start"] = tracemalloc.get_traced_memory()[0]
+
+    gc.collect()
+    operations["count"] = 0
+    tracemalloc.start()
+    start_blocks = sys.getallocatedblocks()
+    allocation["start"] = tracemalloc.get_traced_memory()[0]
+    case(count, allocation_tick)
+    gc.collect() # also empties python's free lists, they would count as kept otherwise
+    kept_blocks = sys.getallocatedblocks() - start_blocks
+    tracemalloc.stop()
+
+    return {
+        "ops_per_second":  timed_operations / elapsed,
+        "bytes_per_op":    allocation["bytes"] / max(1, operations["count"]),
+        "blocks_kept_per_op": kept_blocks / max(1, operations["count"]),
+        "draws_per_op":    draws / max(1, timed_operations)
+    }
+
+def run_benchmarks(game, draw_counter, only=None):
+    results = {}
+    for name, case, count in create_cases(game):
+        if only and not any(word in name for word in only):
+            continue
+        results[name] = measure(case, count, draw_counter)
+        print_result(name, results[name])
+    return results
+
+# ==============================================================================
+# reporting
+# ==============================================================================
+def print_result(name, result):
+    line = (f"{name:26s} {result['ops_per_second']:12,.1f} ops/s | {result['bytes_per_op'] / 1024:9.2f} KiB/op"
+            f" | {result['blocks_kept_per_op']:7.2f} blocks kept/op | {result['draws_per_op']:7.1f} draws/op")
+    print(line, flush=True)
+
+def compare_with_baseline(results, baseline):
+    print(f"\n{'compared to baseline':26s} {'ops/s':>12s}   {'KiB/op':>9s}   {'draws/op':>9s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = lambda key: (result[key] / baseline[name][key] - 1) * 100 if baseline[name][key] else 0.0
+        print(f"{name:26s} {change('ops_per_second'):+11.1f}% | {change('bytes_per_op'):+8.1f}% | {change('draws_per_op'):+8.1f}%")
+
+def baseline_path(backend):
+    return os.path.join(baseline_directory, f"baseline_{backend}.json")
+
+# ==============================================================================
+# command line
+# ==============================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time the pumpkin game's rendering and game hot paths without a screen")
+    parser.add_argument("--backend", choices=["window", "recording"], default="window",
+                        help="window: a real psychopy window that doesn't wait for vsync (needs a display), "
+                             "recording: psychopy replaced by a recorder, runs anywhere")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the baseline of the backend")
+    parser.add_argument("--only", nargs="*", help="only run cases whose name contains one of these words")
+    arguments = parser.parse_args()
+
+    if arguments.backend == "recording":
+        install_recording_psychopy()
+    random.seed(0)
+
+    import pumpkin as game
+    from psychopy.visual.basevisual import MinimalStim
+    game.open_window("windowed-novsync")
+
+    draw_counter = count_draw_calls(MinimalStim)
+    game.event = create_scripted_event(game.event)
+    install_frame_counter(game)
+
+    results = run_benchmarks(game, draw_counter, only=arguments.only)
+
+    path = baseline_path(arguments.backend)
+    if arguments.save_baseline:
+        os.makedirs(baseline_directory, exist_ok=True)
+        with open(path, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+        print(f"\nbaseline saved to {path}")
+    elif os.path.exists(path):
+        with open(path) as baseline_file:
+            compare_with_baseline(results, json.load(baseline_file))
+
+    game.window.close()
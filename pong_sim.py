@@ -0,0 +1,262 @@
+# ==============================================================================
+# headless pong simulation
+# ==============================================================================
+# the pong physics without any window, sound or input, stepping many independent
+# games at once as numpy arrays. run_pong uses it for a single game, replay.py plays
+# recorded games through it and `python pong_sim.py` sweeps the difficulty speeds
+# to tune them offline.
+import argparse
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+
+# ==============================================================================
+# pong field & difficulty
+# ==============================================================================
+reference_frame_rate = 60.0 # the difficulty speeds are per frame at 60 FPS
+
+difficulty_names  = ["Easy", "Medium", "Hard"]
+difficulty_speeds = [0.010, 0.014, 0.020] # ball x speed per 60 FPS frame
+
+ball_radius   = 0.13 # half of pumpkin_outer_size
+paddle_height = 0.25
+paddle_width  = 0.03
+paddle_x_position = -0.95
+paddle_right  = paddle_x_position + paddle_width / 2
+
+start_y_range = (-0.80, 0.80)
+
+# ==============================================================================
+# create games
+# ==============================================================================
+def create_games(count, ball_speed, start_y=None, rng=None):
+    # ball_speed is the difficulty speed (per 60 FPS frame), velocities are stored per second
+    if start_y is None:
+        if rng is None:
+            rng = np.random.default_rng()
+        start_y = rng.uniform(start_y_range[0], start_y_range[1], count)
+
+    velocity_x = ball_speed * reference_frame_rate
+    return {
+        "ball_x":   np.zeros(count),
+        "ball_y":   np.broadcast_to(np.asarray(start_y, dtype=float), (count,)).copy(),
+        "velocity_x": np.full(count, velocity_x),
+        "velocity_y": np.full(count, velocity_x / 2.5),
+        "paddle_y": np.zeros(count),
+        "score":    np.zeros(count, dtype=np.int64),
+        "lost":     np.zeros(count, dtype=bool)
+    }
+
+# ==============================================================================
+# step games
+# ==============================================================================
+max_bounces_per_step = 4 # corners need two, more than that only happens with absurd steps
+
+def step_games(games, dt):
+    # advances every game that is still running by dt seconds, returns per-game event flags.
+    # collisions are swept: each bounce happens at its exact time of impact inside the step,
+    # so the ball can't pass through the paddle however big the step or the speed gets
+    ball_x, ball_y = games["ball_x"], games["ball_y"]
+    velocity_x, velocity_y = games["velocity_x"], games["velocity_y"]
+
+    count = len(ball_x)
+    wall_hit   = np.zeros(count, dtype=bool)
+    paddle_hit = np.zeros(count, dtype=bool)
+    lost       = np.zeros(count, dtype=bool)
+
+    # most balls touch nothing during a step, those just move
+    active = ~games["lost"]
+    next_x = ball_x + velocity_x * dt
+    next_y = ball_y + velocity_y * dt
+    touching = active & ((next_y + ball_radius > +1.0) | (next_y - ball_radius < -1.0)
+                         | (next_x + ball_radius >= 1.0) | (next_x - ball_radius <= paddle_right))
+    free = active & ~touching
+    ball_x[free] = next_x[free]
+    ball_y[free] = next_y[free]
+
+    colliding = np.flatnonzero(touching)
+    if len(colliding) == 0:
+        return {"wall_hit": wall_hit, "paddle_hit": paddle_hit, "lost": lost}
+
+    # the few that do get moved from impact to impact
+    x,  y  = ball_x[colliding],     ball_y[colliding]
+    vx, vy = velocity_x[colliding], velocity_y[colliding]
+    paddle_top    = games["paddle_y"][colliding] + paddle_height / 2
+    paddle_bottom = games["paddle_y"][colliding] - paddle_height / 2
+    time_left = np.full(len(colliding), dt)
+    hits = np.zeros(len(colliding), dtype=np.int64)
+    walls, paddles, misses = (np.zeros(len(colliding), dtype=bool) for i in range(3))
+    colliding_index = np.arange(len(colliding))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for bounce in range(max_bounces_per_step + 1):
+            # time until the ball touches each surface it is moving towards (0 if it already overlaps)
+            times = np.empty((len(colliding), 5))
+            times[:, 0] = np.where(vy > 0, (+1.0 - ball_radius - y) / vy, np.inf) # top
+            times[:, 1] = np.where(vy < 0, (-1.0 + ball_radius - y) / vy, np.inf) # bottom
+            times[:, 2] = np.where(vx > 0, (+1.0 - ball_radius - x) / vx, np.inf) # right
+            times[:, 4] = np.where(vx < 0, (-1.0 + ball_radius - x) / vx, np.inf) # behind the paddle
+
+            # the paddle face only counts while the ball is still in front of it and meets it between top and bottom
+            in_front = (vx < 0) & (x - ball_radius >= paddle_right)
+            time_paddle = np.where(in_front, (paddle_right + ball_radius - x) / vx, 0.0)
+            impact_y = y + vy * time_paddle
+            times[:, 3] = np.where(in_front & (paddle_bottom < impact_y) & (impact_y < paddle_top), time_paddle, np.inf)
+
+            np.maximum(times, 0.0, out=times)
+            first = times.argmin(axis=1)
+            time_hit = times[colliding_index, first]
+
+            # move to the first impact, or all the way if nothing is hit this step
+            hit = (time_left > 0) & (time_hit <= time_left)
+            if bounce == max_bounces_per_step:
+                hit[:] = False
+            advance = np.where(hit, time_hit, time_left)
+            x += vx * advance
+            y += vy * advance
+            time_left -= advance
+
+            # bounce top/bottom & right wall
+            bounced_y = hit & (first <= 1)
+            bounced_x = hit & (first == 2)
+            vy[bounced_y] *= -1
+            vx[bounced_x] *= -1
+            walls |= bounced_y | bounced_x
+
+            # paddle collision
+            returned = hit & (first == 3)
+            vx[returned] *= -1
+            hits += returned
+            paddles |= returned
+
+            # lose condition
+            missed = hit & (first == 4)
+            misses |= missed
+            time_left[missed] = 0.0
+
+            if not (time_left > 0).any():
+                break
+
+    ball_x[colliding], ball_y[colliding] = x, y
+    velocity_x[colliding], velocity_y[colliding] = vx, vy
+    games["score"][colliding] += hits
+    wall_hit[colliding], paddle_hit[colliding], lost[colliding] = walls, paddles, misses
+    games["lost"] |= lost
+    return {"wall_hit": wall_hit, "paddle_hit": paddle_hit, "lost": lost}
+
+# ==============================================================================
+# human player
+# ==============================================================================
+player_paddle_speed = 1.6 # units per second while ↑/↓ are held
+paddle_limit = 1.0 - paddle_height / 2
+
+def move_player_paddles(games, direction, dt):
+    # direction +1 (up), -1 (down) or 0, the paddle stops at the edges of the field
+    games["paddle_y"] += direction * player_paddle_speed * dt
+    np.clip(games["paddle_y"], -paddle_limit, +paddle_limit, out=games["paddle_y"])
+
+# ==============================================================================
+# computer player
+# ==============================================================================
+def move_paddles(games, dt, paddle_speed, aim_offset):
+    # moves every paddle towards where it wants to meet the ball, at most paddle_speed units per second
+    target = games["ball_y"] + aim_offset
+    max_move = paddle_speed * dt
+    games["paddle_y"] += np.clip(target - games["paddle_y"], -max_move, +max_move)
+
+# ==============================================================================
+# simulate one batch
+# ==============================================================================
+def simulate(ball_speed, count, seed=None, dt=1/60.0, paddle_speed=1.2, aim_error=0.08, max_time=120.0):
+    # plays count rallies until every ball is lost (or max_time runs out), returns the scores
+    rng = np.random.default_rng(seed)
+    games = create_games(count, ball_speed, rng=rng)
+    aim_offset = rng.normal(0.0, aim_error, count)
+
+    scores = []
+    for tick in range(int(max_time / dt)):
+        move_paddles(games, dt, paddle_speed, aim_offset)
+        events = step_games(games, dt)
+
+        # a new aim error for every return, like a player who never hits the same spot twice
+        hits = events["paddle_hit"]
+        if hits.any():
+            aim_offset[hits] = rng.normal(0.0, aim_error, int(hits.sum()))
+
+        # drop finished games once they are the majority so the arrays stay dense
+        if tick % 64 == 0 and games["lost"].sum() * 2 > len(games["lost"]):
+            finished = games["lost"]
+            scores.append(games["score"][finished])
+            games = {name: values[~finished] for name, values in games.items()}
+            aim_offset = aim_offset[~finished]
+            if len(aim_offset) == 0:
+                break
+
+    scores.append(games["score"])
+    return np.concatenate(scores)
+
+def simulate_histogram(ball_speed, count, seed, options):
+    # process pool job, a histogram is much cheaper to send back than every score
+    return np.bincount(simulate(ball_speed, count, seed=seed, **options))
+
+# ==============================================================================
+# difficulty sweep
+# ==============================================================================
+def sweep_difficulties(speeds=difficulty_speeds, rallies_per_speed=1_000_000, batch_size=20_000, workers=None, seed=0, **options):
+    # spreads the batches of every speed over all cores, returns {speed: score histogram}
+    batches = max(1, rallies_per_speed // batch_size)
+    histograms = {speed: np.zeros(1, dtype=np.int64) for speed in speeds}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        jobs = {}
+        for speed_index, speed in enumerate(speeds):
+            for batch in range(batches):
+                job_seed = (seed, speed_index, batch) # independent but reproducible streams per batch
+                jobs[pool.submit(simulate_histogram, speed, batch_size, job_seed, options)] = speed
+
+        for job in concurrent.futures.as_completed(jobs):
+            speed = jobs[job]
+            histogram = job.result()
+            if len(histogram) > len(histograms[speed]):
+                histogram, histograms[speed] = histograms[speed], histogram
+            histograms[speed][:len(histogram)] += histogram
+    return histograms
+
+def summarize_histogram(histogram):
+    rallies = histogram.sum()
+    cumulative = np.cumsum(histogram)
+    percentile = lambda p: int(np.searchsorted(cumulative, p * rallies))
+    return {
+        "rallies": int(rallies),
+        "mean": float((np.arange(len(histogram)) * histogram).sum() / rallies),
+        "p50": percentile(0.50),
+        "p90": percentile(0.90),
+        "p99": percentile(0.99)
+    }
+
+# ==============================================================================
+# command line
+# ==============================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sweep the pong difficulty speeds with a computer player")
+    parser.add_argument("--rallies", type=int, default=1_000_000, help="rallies per difficulty")
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to all cores")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--paddle-speed", type=float, default=1.2, help="computer paddle speed in units per second")
+    parser.add_argument("--aim-error", type=float, default=0.08, help="std dev of where the paddle meets the ball")
+    arguments = parser.parse_args()
+
+    start_time = time.perf_counter()
+    histograms = sweep_difficulties(rallies_per_speed=arguments.rallies, batch_size=arguments.batch_size, workers=arguments.workers,
+                                    seed=arguments.seed, paddle_speed=arguments.paddle_speed, aim_error=arguments.aim_error)
+    elapsed = time.perf_counter() - start_time
+
+    total_rallies = 0
+    for name, speed in zip(difficulty_names, difficulty_speeds):
+        summary = summarize_histogram(histograms[speed])
+        total_rallies += summary["rallies"]
+        print(f"{name:8s} speed {speed:.3f} | {summary['rallies']:>9d} rallies | mean score {summary['mean']:6.2f} | p50 {summary['p50']:3d} | p90 {summary['p90']:3d} | p99 {summary['p99']:3d}")
+    print(f"{total_rallies} rallies in {elapsed:.1f}s ({total_rallies / elapsed * 60:,.0f} rallies per minute)")
@@ -1,27 +1,147 @@
 # ==============================================================================
 # importing
 # ==============================================================================
+import time
+process_start_time = time.perf_counter() # for the time to first frame, before the slow psychopy import
+
 from psychopy import visual, event, core, sound
+from psychopy.visual import shape
+import atexit
+import collections
+import functools
+import heapq
+import itertools
+import json
 import math
-import random
+import os
+import queue
+import sys
+import threading
+
+import numpy
+
+import pong_sim
+import replay
+import scores
+import skin_assets
+import squash_sim
 
 # ==============================================================================
 # window setup
 # ==============================================================================
 
-# use this one for fullscreen:
-window = visual.Window(fullscr=True, units="norm", color="black")
+# the window only opens in main() (or a tool calling open_window), importing opens nothing.
+# open_window also loads the skins and registers the F3 hotkey, so importing has no side effects.
+# PUMPKIN_WINDOW=windowed for a windowed screen, PUMPKIN_WINDOW=windowed-novsync is the small window
+# benchmark.py draws into, it doesn't wait for vsync so frames are timed by their own work. it's
+# still a real window, so it needs a display (xvfb-run works, software GL is fine)
+window = None
+
+def open_window(window_mode=None):
+    global window
+    if window is not None:
+        return window
+    if window_mode is None:
+        window_mode = os.environ.get("PUMPKIN_WINDOW", "fullscreen")
+    
+    if window_mode == "fullscreen":
+        window = visual.Window(fullscr=True, units="norm", color="black")
+    elif window_mode == "windowed":
+        window = visual.Window([1820,980], units="norm", color="black")
+    elif window_mode == "windowed-novsync":
+        window = visual.Window([640,480], units="norm", color="black", waitBlanking=False)
+    else:
+        raise ValueError(f"unknown window mode {window_mode!r}, use fullscreen, windowed or windowed-novsync")
+    
+    load_skin_table()
+    event.globalKeys.add(key='f3', func=toggle_profiler_hud, name='profiler hud')
+    return window
 
-#use this one for a windowed screen:
-#window = visual.Window([1820,980], units="norm", color="black")
+# ==============================================================================
+# tone bank
+# ==============================================================================
+audio_sample_rate = 48000
+note_steps_from_a = {"C": -9, "D": -7, "E": -5, "F": -4, "G": -2, "A": 0, "B": 2}
+
+@functools.lru_cache(maxsize=None)
+def get_tone(note, octave, secs):
+    # sine samples for a note, same tuning as sound.Sound(note, octave=octave), shared by music & effects
+    frequency = 440.0 * 2.0 ** ((note_steps_from_a[note] + 12 * (octave - 4)) / 12.0)
+    samples = numpy.sin(2 * math.pi * frequency * numpy.arange(int(round(secs * audio_sample_rate))) / audio_sample_rate)
+    
+    # 5 ms fade in & out so the notes don't click
+    fade = min(len(samples) // 2, int(0.005 * audio_sample_rate))
+    ramp = numpy.linspace(0.0, 1.0, fade)
+    samples[:fade] *= ramp
+    samples[len(samples) - fade:] *= ramp[::-1]
+    
+    samples.flags.writeable = False # cached, so nobody gets to change it
+    return samples
+
+def create_tone_sound(note, octave, secs):
+    return sound.Sound(value=get_tone(note, octave, secs), sampleRate=audio_sample_rate)
 
 # ==============================================================================
 # sound effects setup
 # ==============================================================================
-hit_sound    = sound.Sound('A', secs=0.1)
-lose_sound_1 = sound.Sound('F', secs=0.3, octave=4)
-lose_sound_2 = sound.Sound('D', secs=0.3, octave=4)
-lose_sound_3 = sound.Sound('B', secs=1.2, octave=3)
+# (note, octave, secs), the psychopy sounds (and the audio backend) are only made the first time
+# an effect plays or the startup warm-up gets to them
+sound_effects = {
+    "hit":    ('A', 4, 0.1),
+    "lose_1": ('F', 4, 0.3),
+    "lose_2": ('D', 4, 0.3),
+    "lose_3": ('B', 3, 1.2)
+}
+
+@functools.lru_cache(maxsize=None)
+def get_sound_effect(name):
+    note, octave, secs = sound_effects[name]
+    return create_tone_sound(note, octave, secs)
+
+def play_sound_effect(name):
+    get_sound_effect(name).play()
+
+# (sound effect, start offset in seconds)
+lose_sound_sequence  = [("lose_1", 0.00), ("lose_2", 0.45), ("lose_3", 0.90)]
+equip_sound_sequence = [("hit",    0.00), ("hit",    0.20)]
+deny_sound_sequence  = [("lose_1", 0.00), ("lose_2", 0.40), ("lose_3", 0.80)]
+
+# ==============================================================================
+# sound scheduler
+# ==============================================================================
+# sounds queued with a start time and played from a background thread, so frames keep
+# rendering and input keeps being read while a sound sequence plays
+sound_queue           = [] # heap of (start time, queue order, sound effect name)
+sound_queue_condition = threading.Condition()
+sound_queue_order     = itertools.count() # keeps sounds with the same start time in order
+sound_scheduler_thread = None
+
+def run_sound_scheduler():
+    while True:
+        with sound_queue_condition:
+            while not sound_queue:
+                sound_queue_condition.wait()
+            time_until_start = sound_queue[0][0] - core.getTime()
+            if time_until_start > 0:
+                sound_queue_condition.wait(time_until_start) # wakes up early if something sooner gets queued
+                continue
+            start_time, order, sound_effect = heapq.heappop(sound_queue)
+        play_sound_effect(sound_effect)
+
+def schedule_sound(sound_effect, delay=0.0):
+    global sound_scheduler_thread
+    if sound_scheduler_thread is None:
+        sound_scheduler_thread = threading.Thread(target=run_sound_scheduler, name="sound scheduler", daemon=True)
+        sound_scheduler_thread.start()
+    
+    with sound_queue_condition:
+        heapq.heappush(sound_queue, (core.getTime() + delay, next(sound_queue_order), sound_effect))
+        sound_queue_condition.notify()
+
+def play_sound_sequence(sequence):
+    # queues the whole sequence and returns right away
+    for sound_effect, offset in sequence:
+        schedule_sound(sound_effect, offset)
 
 # ==============================================================================
 # pumpkin default variables
@@ -42,128 +162,235 @@ pumpkin_y_position = 0.0
 # ==============================================================================
 # skin assets
 # ==============================================================================
-skins = {
-    "body": {
-        "orange": {"outer_color": "#ff7b00", "inner_color": "#ff9b33"},
-        "white":  {"outer_color": "#ffffff", "inner_color": "#dddddd"},
-        "black":  {"outer_color": "#222222", "inner_color": "#555555"},
-        "purple": {"outer_color": "#800080", "inner_color": "#b19cd9"},
-        "green":  {"outer_color": "#2a7b1b", "inner_color": "#58a65c"}
-    },
-    "eyes": {
-        "triangle": {"edges":  3, "color": "black"},
-        "circle":   {"edges": 20, "color": "black"},
-        "yellow":   {"edges":  5, "color": "yellow"},
-        "blue":     {"edges":  4, "color": "blue"},
-        "red":      {"edges":  6, "color": "red"}
-    },
-    "mouth": {
-        "black":  {"width": pumpkin_mouth_width,"height": pumpkin_mouth_height,"color": "black"},
-        "green":  {"width": pumpkin_mouth_width,"height": pumpkin_mouth_height,"color": "green"},
-        "red":    {"width": pumpkin_mouth_width,"height": pumpkin_mouth_height,"color": "red"},
-        "blue":   {"width": pumpkin_mouth_width,"height": pumpkin_mouth_height,"color": "blue"},
-        "orange": {"width": pumpkin_mouth_width,"height": pumpkin_mouth_height,"color": "orange"}
-    },
-    "stem": {
-        "green":  {"stem_color":"#2a7b1b", "leaf_color":"#2a7b1b"},
-        "brown":  {"stem_color":"#8b4513", "leaf_color":"#8b4513"},
-        "yellow": {"stem_color":"#ffff00", "leaf_color":"#ffff00"},
-        "red":    {"stem_color":"#ff0000", "leaf_color":"#ff0000"},
-        "purple": {"stem_color":"#800080", "leaf_color":"#800080"}
-    }
-}
+# the skins are defined in skins.json, skin_assets compiles them once into rgb floats and
+# lookup tables (and caches that on disk), so no color string is parsed while the game runs.
+# open_window() loads them, these are filled in place so every name below stays the same object
+skin_table     = {}
+eye_skin_edges = {} # eye skin name --> edges of the eye shape
+skin_key_index = {} # part --> position in a skin key
+
+def load_skin_table():
+    if skin_table:
+        return
+    skin_table.update(skin_assets.load_skins())
+    eye_skin_edges.update(skin_table["eye_edges"])
+    skin_key_index.update({part: index for index, part in enumerate(skin_table["part_order"])})
+    parts_order.extend(skin_table["part_order"])
+    part_skins.update(skin_table["skin_names"])
+    skin_unlock_scores.update(skin_table["unlock_scores"])
 
 # currently equipped skin
 current_skin = {"body":"orange","eyes":"triangle","mouth":"black","stem":"green"}
 
 
+# ==============================================================================
+# pumpkin geometry
+# ==============================================================================
+# (part, edges (None for a rectangle, "eyes" for the skin's eye shape), base size, offset from the center, base ori)
+pumpkin_part_layout = [
+    ("outer_shell", 10,     (pumpkin_outer_size,  pumpkin_outer_size),   ( 0.000,  0.000),   0),
+    ("inner_shell", 10,     (pumpkin_inner_size,  pumpkin_inner_size),   ( 0.000,  0.000),   0),
+    ("leaf",         3,     (pumpkin_leaf_size,   pumpkin_leaf_size),    (+0.035, +0.180),  45),
+    ("left_eye",    "eyes", (pumpkin_eye_size,    pumpkin_eye_size),     (-0.060, +0.035), 180),
+    ("right_eye",   "eyes", (pumpkin_eye_size,    pumpkin_eye_size),     (+0.060, +0.035), 180),
+    ("nose",         3,     (pumpkin_nose_size,   pumpkin_nose_size),    ( 0.000, -0.025), 180),
+    ("mouth",       None,   (pumpkin_mouth_width, pumpkin_mouth_height), ( 0.000, -0.080),   0),
+    ("stem",        None,   (pumpkin_stem_width,  pumpkin_stem_height),  ( 0.000, +0.140),   0)
+]
+pumpkin_part_names = [part for part, edges, size, offset, ori in pumpkin_part_layout]
+
+def rotation_matrix(ori):
+    # psychopy's ori is clockwise in degrees, vertices are rows: rotated = vertices @ matrix
+    radians = math.radians(ori)
+    return numpy.array([[math.cos(radians), -math.sin(radians)],
+                        [math.sin(radians),  math.cos(radians)]])
+
+@functools.lru_cache(maxsize=None)
+def unit_shape_vertices(edges):
+    # shared, read-only unit shapes: same vertices as psychopy's Polygon (radius 0.5, first one on top) and Rect
+    if edges is None:
+        vertices = numpy.array([(-0.5, +0.5), (+0.5, +0.5), (+0.5, -0.5), (-0.5, -0.5)])
+    else:
+        d = 2 * math.pi / edges
+        vertices = numpy.array([(0.5 * math.sin(e * d), 0.5 * math.cos(e * d)) for e in range(edges)])
+    vertices.flags.writeable = False
+    return vertices
+
+@functools.lru_cache(maxsize=None)
+def pumpkin_local_geometry(eye_edges):
+    # every part of a pumpkin at scale 1 around (0, 0), stacked into one array, plus each part's rows in it
+    part_vertices = []
+    part_slices = []
+    start = 0
+    for part, edges, size, offset, ori in pumpkin_part_layout:
+        unit_vertices = unit_shape_vertices(eye_edges if edges == "eyes" else edges)
+        part_vertices.append((unit_vertices * size) @ rotation_matrix(ori) + offset)
+        part_slices.append((part, slice(start, start + len(unit_vertices))))
+        start += len(unit_vertices)
+    
+    local_vertices = numpy.concatenate(part_vertices)
+    local_vertices.flags.writeable = False
+    return local_vertices, tuple(part_slices)
+
+def transform_pumpkin_geometry(local_vertices, x, y, scale, rotation):
+    # scales and rotates all parts about the pumpkin's center and moves them into place, in one go
+    return local_vertices @ (scale * rotation_matrix(rotation)) + (x, y)
+
+# ==============================================================================
+# pumpkin
+# ==============================================================================
+class Pumpkin:
+    # the eight part stimuli plus the pumpkin's transform. position, scale and rotation are only
+    # recorded when set and pushed into the stimuli once, right before drawing, if they changed
+    __slots__ = ("outer_shell", "inner_shell", "leaf", "left_eye", "right_eye", "nose", "mouth", "stem",
+                 "scale", "rotation", "pumpkin_x_position", "pumpkin_y_position", "skin", "sprite",
+                 "eye_edges", "transform_changed")
+    
+    def __init__(self, parts, x, y, skin_key, eye_edges, sprite):
+        for part_name, part in parts.items():
+            setattr(self, part_name, part)
+        self.scale = 1.0
+        self.rotation = 0.0
+        self.pumpkin_x_position = x
+        self.pumpkin_y_position = y
+        self.skin = skin_key
+        self.eye_edges = eye_edges
+        self.sprite = sprite # opt-in: draw from the sprite cache instead of part by part
+        self.transform_changed = False
+    
+    def set_scale(self, scale):
+        if scale != self.scale:
+            self.scale = scale
+            self.transform_changed = True
+    
+    def set_rotation(self, rotation):
+        if rotation != self.rotation:
+            self.rotation = rotation
+            self.transform_changed = True
+    
+    def set_position(self, x, y):
+        if x != self.pumpkin_x_position or y != self.pumpkin_y_position:
+            self.pumpkin_x_position = x
+            self.pumpkin_y_position = y
+            self.transform_changed = True
+    
+    def apply_changes(self):
+        # one matrix transform for all parts, then every part gets its new vertices once
+        if not self.transform_changed:
+            return
+        local_vertices, part_slices = pumpkin_local_geometry(self.eye_edges)
+        vertices = transform_pumpkin_geometry(local_vertices, self.pumpkin_x_position, self.pumpkin_y_position, self.scale, self.rotation)
+        for part, part_slice in part_slices:
+            getattr(self, part).vertices = vertices[part_slice]
+        self.transform_changed = False
+    
+    # dict style access, so code written for the old pumpkin dicts keeps working
+    def __getitem__(self, key):
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key == "scale":
+            self.set_scale(value)
+        elif key == "rotation":
+            self.set_rotation(value)
+        elif key == "pumpkin_x_position":
+            self.set_position(value, self.pumpkin_y_position)
+        elif key == "pumpkin_y_position":
+            self.set_position(self.pumpkin_x_position, value)
+        else:
+            setattr(self, key, value)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
 # ==============================================================================
 # create pumpkin
 # ==============================================================================
-def create_pumpkin(x, y, skin=None):
+@functools.lru_cache(maxsize=None)
+def skin_part_rgb(part, skin_key):
+    # the psychopy rgb (-1..1) color of one part for a (body, eyes, mouth, stem) skin
+    category = skin_table["part_categories"].get(part)
+    if category is None:
+        return tuple(skin_table["fixed_colors"][part])
+    return tuple(skin_table["colors"][category][skin_key[skin_key_index[category]]][part])
+
+def create_pumpkin(x, y, skin=None, sprite=False):
     if skin is None: 
         skin = current_skin
-
-    body_skin  = skins["body"][skin["body"]]
-    eye_skin   = skins["eyes"][skin["eyes"]]
-    mouth_skin = skins["mouth"][skin["mouth"]]
-    stem_skin  = skins["stem"][skin["stem"]]
-
-    outer_shell = visual.Polygon(window, edges=10, fillColor=body_skin["outer_color"], lineColor=body_skin["outer_color"], size=pumpkin_outer_size, pos=(x, y))
-    inner_shell = visual.Polygon(window, edges=10, fillColor=body_skin["inner_color"], lineColor=body_skin["inner_color"], size=pumpkin_inner_size, pos=(x, y))
-    leaf        = visual.Polygon(window, edges= 3, fillColor=stem_skin["leaf_color"],  lineColor=stem_skin["leaf_color"],  size=pumpkin_leaf_size,  pos=(x + 0.035, y + 0.18), ori=45)
-    nose        = visual.Polygon(window, edges= 3, fillColor="black",                  lineColor="black",                  size=pumpkin_nose_size,  pos=(x, y - 0.025), ori=180)
+    skin_key  = pumpkin_skin_key(skin)
+    eye_edges = eye_skin_edges[skin["eyes"]]
     
-    left_eye    = visual.Polygon(window, edges=eye_skin["edges"], fillColor=eye_skin["color"], lineColor=eye_skin["color"], size=pumpkin_eye_size,  pos=(x - 0.06, y + 0.035), ori=180)
-    right_eye   = visual.Polygon(window, edges=eye_skin["edges"], fillColor=eye_skin["color"], lineColor=eye_skin["color"], size=pumpkin_eye_size,  pos=(x + 0.06, y + 0.035), ori=180)
+    # the parts are plain shapes whose vertices already contain the whole pumpkin transform
+    local_vertices, part_slices = pumpkin_local_geometry(eye_edges)
+    vertices = transform_pumpkin_geometry(local_vertices, x, y, 1.0, 0.0)
+    parts = {}
+    for part, part_slice in part_slices:
+        color = skin_part_rgb(part, skin_key)
+        parts[part] = shape.BaseShapeStim(window, vertices=vertices[part_slice], fillColor=color, lineColor=color, colorSpace="rgb", closeShape=True)
     
-    mouth = visual.Rect(window, width=mouth_skin["width"], height=mouth_skin["height"], fillColor=mouth_skin["color"],     lineColor=mouth_skin["color"],     pos=(x, y - 0.08))
-    stem  = visual.Rect(window, width=pumpkin_stem_width,  height=pumpkin_stem_height,  fillColor=stem_skin["stem_color"], lineColor=stem_skin["stem_color"], pos=(x, y + 0.14))
+    return Pumpkin(parts, x, y, skin_key, eye_edges, sprite)
 
-    return {
-        "outer_shell": outer_shell,
-        "inner_shell": inner_shell,
-        "leaf": leaf,
-        "left_eye": left_eye,
-        "right_eye": right_eye,
-        "nose": nose,
-        "mouth": mouth,
-        "stem": stem,
-        "scale": 1.0,
-        "pumpkin_x_position": x,
-        "pumpkin_y_position": y
-    }
 
+# ==============================================================================
+# set pumpkin skin
+# ==============================================================================
+def set_pumpkin_skin(pumpkin, skin):
+    # re-skin the existing stimuli instead of building a new pumpkin
+    skin_key = pumpkin_skin_key(skin)
+    for part in pumpkin_part_names:
+        color = skin_part_rgb(part, skin_key)
+        if color == skin_part_rgb(part, pumpkin.skin):
+            continue # only parts whose color changes need new colors
+        pumpkin[part].fillColor = color
+        pumpkin[part].lineColor = color
+    
+    eye_edges = eye_skin_edges[skin["eyes"]]
+    if eye_edges != pumpkin.eye_edges:
+        pumpkin.eye_edges = eye_edges
+        pumpkin.transform_changed = True # the eyes need their new vertices
+    
+    pumpkin.skin = skin_key
 
 # ==============================================================================
 # set pumpkin scale
 # ==============================================================================
 def set_pumpkin_scale(pumpkin, scale):
-    pumpkin["outer_shell"]  .setSize(pumpkin_outer_size   * scale)
-    pumpkin["inner_shell"]  .setSize(pumpkin_inner_size   * scale)
-    pumpkin["leaf"]         .setSize(pumpkin_leaf_size    * scale)
-    pumpkin["left_eye"]     .setSize(pumpkin_eye_size     * scale)
-    pumpkin["right_eye"]    .setSize(pumpkin_eye_size     * scale)
-    pumpkin["nose"]         .setSize(pumpkin_nose_size    * scale)
-    pumpkin["mouth"]        .setSize((pumpkin_mouth_width * scale, pumpkin_mouth_height * scale))
-    pumpkin["stem"]         .setSize((pumpkin_stem_width  * scale, pumpkin_stem_height  * scale))
+    pumpkin.set_scale(scale)
 
 # ==============================================================================
 # set pumpkin rotation
 # ==============================================================================
 def set_pumpkin_rotation(pumpkin, rotation):
-    pumpkin["outer_shell"]  .setOri(rotation)
-    pumpkin["inner_shell"]  .setOri(rotation)
-    pumpkin["leaf"]         .setOri(rotation+ 45)
-    pumpkin["left_eye"]     .setOri(rotation+180)
-    pumpkin["right_eye"]    .setOri(rotation+180)
-    pumpkin["nose"]         .setOri(rotation+180)
-    pumpkin["mouth"]        .setOri(rotation)
-    pumpkin["stem"]         .setOri(rotation)
+    pumpkin.set_rotation(rotation)
 
 
 # ==============================================================================
 # update pumpkin position
 # ==============================================================================
 def update_pumpkin_position(pumpkin, new_x, new_y):
-    scale = pumpkin.get("scale", 1.0)
-    
-    pumpkin["pumpkin_x_position"] = new_x
-    pumpkin["pumpkin_y_position"] = new_y
-    
-    pumpkin["outer_shell"]  .pos = (new_x + 0.000 * scale, new_y + 0.000 * scale)
-    pumpkin["inner_shell"]  .pos = (new_x + 0.000 * scale, new_y + 0.000 * scale)
-    pumpkin["leaf"]         .pos = (new_x + 0.035 * scale, new_y + 0.180 * scale)
-    pumpkin["left_eye"]     .pos = (new_x - 0.060 * scale, new_y + 0.035 * scale)
-    pumpkin["right_eye"]    .pos = (new_x + 0.060 * scale, new_y + 0.035 * scale)
-    pumpkin["nose"]         .pos = (new_x + 0.000 * scale, new_y - 0.025 * scale)
-    pumpkin["mouth"]        .pos = (new_x + 0.000 * scale, new_y - 0.080 * scale)
-    pumpkin["stem"]         .pos = (new_x + 0.000 * scale, new_y + 0.140 * scale)
+    pumpkin.set_position(new_x, new_y)
 
 # ==============================================================================
 # draw all pumpkin parts
 # ==============================================================================
 def draw_pumpkin(pumpkin):
+    if pumpkin["sprite"]:
+        sprite = pumpkin_sprite_cache.get(pumpkin["skin"])
+        if sprite is not None:
+            pumpkin_sprite_cache.move_to_end(pumpkin["skin"])
+            sprite_size = 2 * pumpkin_sprite_half_size * pumpkin["scale"]
+            sprite.pos  = (pumpkin["pumpkin_x_position"], pumpkin["pumpkin_y_position"])
+            sprite.size = (sprite_size, sprite_size)
+            sprite.ori  = pumpkin["rotation"]
+            sprite.draw()
+            return
+        
+        # not rasterized yet --> draw the parts this frame and rasterize right after the flip
+        if pumpkin["skin"] not in pumpkin_sprites_pending:
+            pumpkin_sprites_pending.add(pumpkin["skin"])
+            window.callOnFlip(rasterize_pumpkin_sprite, pumpkin["skin"])
+    
+    pumpkin.apply_changes()
     pumpkin["outer_shell"]  .draw()
     pumpkin["inner_shell"]  .draw()
     pumpkin["leaf"]         .draw()
@@ -181,269 +408,1162 @@ def reset_pumpkin_to_defaults(pumpkin):
     set_pumpkin_scale(pumpkin, 1.0)
     update_pumpkin_position(pumpkin, 0.0, 0.0)
     
-    pumpkin["outer_shell"]  .setOri(0)
-    pumpkin["inner_shell"]  .setOri(0)
-    pumpkin["leaf"]         .setOri(45)
-    pumpkin["left_eye"]     .setOri(180)
-    pumpkin["right_eye"]    .setOri(180)
-    pumpkin["nose"]         .setOri(180)
-    pumpkin["mouth"]        .setOri(0)
-    pumpkin["stem"]         .setOri(0)
+    set_pumpkin_rotation(pumpkin, 0)
 
 # ==============================================================================
-# start menu
+# batch rendering
 # ==============================================================================
-def start_menu():
-    # menu options
-    menu_options = ["Play PONG  ", "Listen to Music  ", "Squash Squash  ", "Skin Store  "] # 2 spaces as a suffix needed because I add 2 characters as a prefix later on
-    selected_option = 0
+# draws any number of pumpkins with one ElementArrayStim per part (and eye shape), so the
+# number of draw calls stays the same whether there are 2 pumpkins on screen or 500
+batch_mask_resolution = 128
+
+batch_stims = {} # (part, edges) --> ElementArrayStim, big enough for the most pumpkins drawn with that part so far
+
+@functools.lru_cache(maxsize=None)
+def polygon_mask(edges):
+    # alpha mask of the unit polygon with this many edges (first row at the bottom, like psychopy textures)
+    vertices = unit_shape_vertices(edges)
+    coordinates = (numpy.arange(batch_mask_resolution) + 0.5) / batch_mask_resolution - 0.5
+    x, y = numpy.meshgrid(coordinates, coordinates)
+    inside = numpy.ones(x.shape, dtype=bool)
+    for (x1, y1), (x2, y2) in zip(vertices, numpy.roll(vertices, -1, axis=0)):
+        inside &= (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1) <= 0 # the vertices go clockwise
+    return numpy.where(inside, 1.0, -1.0)
+
+def get_batch_stim(part, edges, count):
+    # one stim per part and shape that only grows (to the next power of two), a smaller batch
+    # hides the elements it doesn't use, so changing crowd sizes never build stims again
+    stim = batch_stims.get((part, edges))
+    if stim is None or stim.nElements < count:
+        capacity = 1 << (count - 1).bit_length()
+        mask = None if edges is None else polygon_mask(edges) # no mask --> a filled rectangle
+        stim = visual.ElementArrayStim(window, units="norm", nElements=capacity, elementTex=None, elementMask=mask,
+                                       sizes=0.1, xys=numpy.zeros((capacity, 2)), colorSpace="rgb")
+        batch_stims[(part, edges)] = stim
+    return stim
+
+def padded(values, capacity):
+    # values for the first len(values) elements of a batch stim, zeros for the hidden rest
+    array = numpy.zeros((capacity,) + values.shape[1:])
+    array[:len(values)] = values
+    return array
+
+def draw_pumpkin_batch(pumpkins):
+    if not pumpkins:
+        return
+    positions = numpy.array([(pumpkin.pumpkin_x_position, pumpkin.pumpkin_y_position) for pumpkin in pumpkins])
+    scales    = numpy.array([pumpkin.scale    for pumpkin in pumpkins])
+    rotations = numpy.array([pumpkin.rotation for pumpkin in pumpkins])
+    radians   = numpy.radians(rotations)
+    rotation_matrices = numpy.stack([numpy.stack([numpy.cos(radians), -numpy.sin(radians)], axis=-1),
+                                     numpy.stack([numpy.sin(radians),  numpy.cos(radians)], axis=-1)], axis=1)
+    
+    # pumpkins grouped by eye shape, every eye shape needs its own mask
+    eye_groups = collections.defaultdict(list)
+    for index, pumpkin in enumerate(pumpkins):
+        eye_groups[eye_skin_edges[pumpkin.skin[skin_key_index["eyes"]]]].append(index)
+    
+    for part, edges, size, offset, ori in pumpkin_part_layout:
+        if edges == "eyes":
+            groups = [(eye_edges, numpy.array(indices)) for eye_edges, indices in eye_groups.items()]
+        else:
+            groups = [(edges, numpy.arange(len(pumpkins)))]
+        
+        for group_edges, indices in groups:
+            stim = get_batch_stim(part, group_edges, len(indices))
+            capacity = stim.nElements
+            rotated_offsets = numpy.einsum("j,njk->nk", offset, rotation_matrices[indices])
+            stim.xys       = padded(positions[indices] + scales[indices, None] * rotated_offsets, capacity)
+            stim.sizes     = padded(numpy.outer(scales[indices], size), capacity)
+            stim.oris      = padded(rotations[indices] + ori, capacity)
+            stim.colors    = padded(numpy.array([skin_part_rgb(part, pumpkins[index].skin) for index in indices]), capacity)
+            stim.opacities = padded(numpy.ones(len(indices)), capacity)
+            stim.draw()
+
+# ==============================================================================
+# pumpkin sprite cache
+# ==============================================================================
+pumpkin_sprite_cache_limit = 32   # max number of skin combinations kept as textures
+pumpkin_sprite_half_size   = 0.22 # square around the pumpkin center, big enough for the leaf tip
+pumpkin_sprite_cache       = collections.OrderedDict() # (body, eyes, mouth, stem) --> sprite, least recently drawn first
+pumpkin_sprites_pending    = set()
+
+def pumpkin_skin_key(skin):
+    return tuple(skin[part] for part in skin_table["part_order"])
+
+def rasterize_pumpkin_sprite(skin_key):
+    # BufferImageStim clears the back buffer, so only call this between frames (e.g. right after a flip)
+    pumpkin_sprites_pending.discard(skin_key)
+    if skin_key in pumpkin_sprite_cache:
+        return pumpkin_sprite_cache[skin_key]
     
-    # pumpkin menu bounce parameters
-    bounce_speed = 1 / 20.0
-    bounce_frame = 0 # needed for bouncing pumpkins
+    body, eyes, mouth, stem = skin_key
+    template = create_pumpkin(0.0, 0.0, skin={"body": body, "eyes": eyes, "mouth": mouth, "stem": stem})
+    half = pumpkin_sprite_half_size
+    sprite = visual.BufferImageStim(window, stim=[template[part] for part in pumpkin_part_names], rect=(-half, +half, +half, -half))
+    sprite.units = "norm" # BufferImageStim comes back in pixels
+    sprite.size  = (2 * half, 2 * half)
+    sprite.mask  = sprite_coverage_mask(eye_skin_edges[eyes])
     
-    # create menu text
-    title        = visual.TextStim(window, text="Happy Halloween!", pos=(0, 0.55), height=0.12, color='orange', bold=True)
-    instructions = visual.TextStim(window, text="Use ↑/↓ to navigate | SPACE to select | ESC to quit", pos=(0, -0.8), height=0.05, color='gray')
+    pumpkin_sprite_cache[skin_key] = sprite
+    while len(pumpkin_sprite_cache) > pumpkin_sprite_cache_limit:
+        pumpkin_sprite_cache.popitem(last=False) # evict the least recently drawn skin
+    return sprite
+
+def polygon_inside(vertices, x, y):
+    # even-odd test of every (x, y) sample against one polygon
+    inside = numpy.zeros(x.shape, dtype=bool)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        for (x1, y1), (x2, y2) in zip(vertices, numpy.roll(vertices, -1, axis=0)):
+            crosses = (y1 > y) != (y2 > y)
+            inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+@functools.lru_cache(maxsize=None)
+def sprite_coverage_mask(eye_edges, mask_size=128):
+    # the capture is a square with the window color around the pumpkin. the mask comes from the
+    # pumpkin's geometry, not from the captured colors: the black nose, eyes and mouth are the
+    # same color as the window and have to stay opaque over grid lines, paddles or other pumpkins
+    local_vertices, part_slices = pumpkin_local_geometry(eye_edges)
+    half = pumpkin_sprite_half_size
+    coordinates = ((numpy.arange(mask_size) + 0.5) / mask_size * 2 - 1) * half
+    x, y = numpy.meshgrid(coordinates, coordinates) # psychopy masks have the first row at the bottom
+    covered = numpy.zeros(x.shape, dtype=bool)
+    for part, part_slice in part_slices:
+        covered |= polygon_inside(local_vertices[part_slice], x, y)
     
-    # create the menu pumpkins
-    menu_pumpkin_left  = create_pumpkin(-0.6, 0)
-    menu_pumpkin_right = create_pumpkin(+0.6, 0)
-    set_pumpkin_scale(menu_pumpkin_left,  1.15)
-    set_pumpkin_scale(menu_pumpkin_right, 1.15)
+    # psychopy masks are square power-of-two arrays in -1..1
+    mask = numpy.where(covered, 1.0, -1.0)
+    mask.flags.writeable = False
+    return mask
+
+def warm_pumpkin_sprite(pumpkin):
+    # rasterize before the first frame so even that one is a single draw
+    if pumpkin["sprite"]:
+        rasterize_pumpkin_sprite(pumpkin["skin"])
+
+# ==============================================================================
+# skin store thumbnails
+# ==============================================================================
+# the skin store previews skins that were never drawn before, and every equip changes all of
+# them. a worker thread rasterizes the previews the store can show next with numpy, the main
+# thread only turns finished pixels into textures (a few per frame) and then draws one quad
+thumbnail_resolution        = 256 # pixels per side of the square around the pumpkin (pumpkin_sprite_half_size)
+thumbnail_supersample       = 2   # samples per pixel and axis, for smooth edges
+thumbnail_cache_limit       = 48  # max number of skin combinations kept as textures
+thumbnail_uploads_per_frame = 2
+
+skin_thumbnail_cache = collections.OrderedDict() # (body, eyes, mouth, stem) --> ImageStim, least recently drawn first
+thumbnail_worker = {
+    "thread": None,
+    "requests": queue.Queue(),     # skin keys for the worker, in the order they're needed
+    "requested": set(),            # skin keys queued or rendered but not uploaded yet, main thread only
+    "ready": collections.deque()   # (skin key, rgb, mask) from the worker
+}
+
+def rasterize_thumbnail_pixels(skin_key):
+    # the pumpkin of a skin as psychopy image and mask arrays (-1..1, first row at the bottom),
+    # numpy only so it runs off the main thread
+    eye_edges = eye_skin_edges[skin_key[skin_key_index["eyes"]]]
+    local_vertices, part_slices = pumpkin_local_geometry(eye_edges)
+    samples = thumbnail_resolution * thumbnail_supersample
+    half = pumpkin_sprite_half_size
+    coordinates = ((numpy.arange(samples) + 0.5) / samples * 2 - 1) * half
+    
+    rgb     = numpy.zeros((samples, samples, 3))
+    covered = numpy.zeros((samples, samples), dtype=bool)
+    for part, part_slice in part_slices:
+        # only the samples inside the part's bounding box are tested, parts later in the list are drawn on top
+        vertices = local_vertices[part_slice]
+        columns = slice(*numpy.searchsorted(coordinates, (vertices[:, 0].min(), vertices[:, 0].max())))
+        rows    = slice(*numpy.searchsorted(coordinates, (vertices[:, 1].min(), vertices[:, 1].max())))
+        x, y = numpy.meshgrid(coordinates[columns], coordinates[rows])
+        inside = polygon_inside(vertices, x, y)
+        rgb[rows, columns][inside] = skin_part_rgb(part, skin_key)
+        covered[rows, columns] |= inside
     
-    # main menu loop
+    # average the samples of every pixel, the edge pixels get partial coverage
+    block_shape = (thumbnail_resolution, thumbnail_supersample, thumbnail_resolution, thumbnail_supersample)
+    coverage = covered.reshape(block_shape).mean(axis=(1, 3))
+    rgb_sum  = (rgb * covered[:, :, None]).reshape(block_shape + (3,)).sum(axis=(1, 3))
+    rgb      = rgb_sum / numpy.maximum(coverage * thumbnail_supersample ** 2, 1)[:, :, None]
+    return rgb, coverage * 2 - 1
+
+def run_thumbnail_worker():
     while True:
-        # bouncing the menu pumpkins
-        bounce_frame += 1
-        y_offset = 0.08 * math.sin(bounce_frame * bounce_speed)
-        update_pumpkin_position(menu_pumpkin_left,  -0.6, +y_offset)
-        update_pumpkin_position(menu_pumpkin_right, +0.6, -y_offset)
-        draw_pumpkin(menu_pumpkin_left)
-        draw_pumpkin(menu_pumpkin_right)
-        
-        # drawing the normal texts
-        title.draw()
-        instructions.draw()
-        
-        # menu selection
-        menu_option_spacing = 0.12
-        for index, option in enumerate(menu_options):
-            if index == selected_option:
-                prefix = "> "
-            else:
-                prefix = "  "
-            menu_option = visual.TextStim(window, text=f"{prefix}{option}", pos=(0, 0.15 - index*menu_option_spacing), height=0.07, color='white', italic=True) # index*0.12 --> controls y_space between menu options
-            menu_option.draw()
+        skin_key = thumbnail_worker["requests"].get()
+        rgb, mask = rasterize_thumbnail_pixels(skin_key)
+        thumbnail_worker["ready"].append((skin_key, rgb, mask))
+        thumbnail_worker["requests"].task_done() # requests.join() waits for everything queued
+
+def request_skin_thumbnails(skin_keys):
+    # queues every skin that isn't a texture or on its way already, call from the main thread
+    if thumbnail_worker["thread"] is None:
+        thumbnail_worker["thread"] = threading.Thread(target=run_thumbnail_worker, name="thumbnails", daemon=True)
+        thumbnail_worker["thread"].start()
+    for skin_key in skin_keys:
+        if skin_key in skin_thumbnail_cache or skin_key in thumbnail_worker["requested"]:
+            continue
+        thumbnail_worker["requested"].add(skin_key)
+        thumbnail_worker["requests"].put(skin_key)
+
+def upload_skin_thumbnails():
+    # turns a few finished thumbnails into textures, returns True if any arrived
+    uploaded = False
+    for i in range(thumbnail_uploads_per_frame):
+        if not thumbnail_worker["ready"]:
+            break
+        skin_key, rgb, mask = thumbnail_worker["ready"].popleft()
+        thumbnail_worker["requested"].discard(skin_key)
         
-        # get key inputs
-        keys_pressed = event.getKeys()
-        if 'up' in keys_pressed: 
-            selected_option = (selected_option - 1) % len(menu_options)
-        if 'down' in keys_pressed: 
-            selected_option = (selected_option + 1) % len(menu_options)
-        if 'space' in keys_pressed or 'return' in keys_pressed: 
-            return selected_option
-        if 'escape' in keys_pressed:
-            window.close()
-            core.quit()
-        
-        # update the window at 60 FPS
-        window.flip()
-        core.wait(1/60.0)
+        half = pumpkin_sprite_half_size
+        skin_thumbnail_cache[skin_key] = visual.ImageStim(window, image=rgb, mask=mask, units="norm", size=(2 * half, 2 * half),
+                                                          colorSpace="rgb", interpolate=True)
+        while len(skin_thumbnail_cache) > thumbnail_cache_limit:
+            skin_thumbnail_cache.popitem(last=False) # evict the least recently drawn skin
+        uploaded = True
+    return uploaded
+
+def draw_skin_thumbnail(skin_key, x, y):
+    # draws the thumbnail if it's ready, returns False if it isn't
+    thumbnail = skin_thumbnail_cache.get(skin_key)
+    if thumbnail is None:
+        return False
+    skin_thumbnail_cache.move_to_end(skin_key)
+    thumbnail.pos = (x, y)
+    thumbnail.draw()
+    return True
 
 # ==============================================================================
-# skin store
+# game loop driver
 # ==============================================================================
-def skin_store(pong_high_score, squash_high_score):
-    event.clearEvents()
+physics_tick_rate      = 60.0  # physics steps per second, the same on every monitor (collisions are swept, so no need to go higher)
+reference_frame_rate   = 60.0  # the per-frame speeds in this game were tuned at 60 FPS
+max_steps_per_frame    = 8     # after a long hitch drop the backlog instead of trying to catch up
+vsync_snap_tolerance   = 0.002 # seconds, frame times this close to a whole number of refreshes get snapped
 
-    # order of pumpkin parts to edit
-    parts_order = ["body","eyes","mouth","stem"]
-    selected_part_index = 0
+measured_refresh_rate = None
 
-    part_skins = {
-        "body":  ["orange",  "white", "black", "purple","green"],
-        "eyes":  ["triangle","circle","yellow","blue",  "red"],
-        "mouth": ["black",   "green", "red",   "blue",  "orange"],
-        "stem":  ["green",   "brown", "yellow","red",   "purple"]
+def measure_refresh_rate():
+    # window.flip() already waits for vsync so this is how long a frame really takes. it flips up
+    # to 65 blank frames (about a second), so it runs once as a startup job, never while playing
+    global measured_refresh_rate
+    frame_rate = window.getActualFrameRate(nIdentical=10, nMaxFrames=60, nWarmUpFrames=5, threshold=1)
+    measured_refresh_rate = frame_rate if frame_rate else reference_frame_rate
+
+def get_refresh_rate():
+    # the reference rate until the startup measurement is done, never blocks
+    return measured_refresh_rate if measured_refresh_rate is not None else reference_frame_rate
+
+def create_game_loop(tick_rate=physics_tick_rate):
+    return {
+        "tick": 1.0 / tick_rate,
+        "refresh_period": 1.0 / get_refresh_rate(),
+        "accumulator": 0.0,
+        "last_frame_time": None,
+        "ticks": 0
     }
 
-    # unlock scores for example
-    skin_unlock_scores = {
-        "body":  {"orange":0,  "white":3, "black":5, "purple":8,"green":12},
-        "eyes":  {"triangle":0,"circle":3,"yellow":7,"blue":10, "red":15},
-        "mouth": {"black":0,   "green":5, "red":10,  "blue":12, "orange":18},
-        "stem":  {"green":0,   "brown":1, "yellow":5,"red":8,   "purple":12}
+def reset_game_loop(game_loop):
+    game_loop["refresh_period"] = 1.0 / get_refresh_rate() # the loop may be older than the measurement
+    game_loop["accumulator"] = 0.0
+    game_loop["last_frame_time"] = None
+
+def advance_game_loop(game_loop):
+    # returns how many fixed physics steps to run before drawing this frame
+    now = core.getTime()
+    if game_loop["last_frame_time"] is None:
+        elapsed = game_loop["refresh_period"]
+    else:
+        elapsed = now - game_loop["last_frame_time"]
+    game_loop["last_frame_time"] = now
+    
+    # frames are paced by vsync, so remove the timer jitter around whole refresh periods
+    refreshes = max(1, round(elapsed / game_loop["refresh_period"]))
+    if abs(elapsed - refreshes * game_loop["refresh_period"]) < vsync_snap_tolerance:
+        elapsed = refreshes * game_loop["refresh_period"]
+    
+    game_loop["accumulator"] += min(elapsed, max_steps_per_frame * game_loop["tick"])
+    steps = int(game_loop["accumulator"] / game_loop["tick"])
+    game_loop["accumulator"] -= steps * game_loop["tick"]
+    game_loop["ticks"] += steps
+    return steps
+
+def game_loop_alpha(game_loop):
+    # how far the drawn frame is between the previous and the current physics state
+    return game_loop["accumulator"] / game_loop["tick"]
+
+# ==============================================================================
+# keyboard state
+# ==============================================================================
+# which keys are held, kept up to date by the window's key events instead of polling for
+# presses. holding a key keeps it down and a tap between two samples still counts once
+keyboard_state = None
+
+def get_keyboard_state():
+    # one set of key handlers for the window, shared by every screen
+    global keyboard_state
+    if keyboard_state is None:
+        keyboard_state = create_keyboard_state()
+    return keyboard_state
+
+def create_keyboard_state():
+    keyboard = {
+        "down": {},       # key name --> time it went down
+        "taps": {},       # key name --> time it went down, for keys released again before the next sample
+        "events": False,  # False --> the window has no key events, presses come from event.getKeys()
+        "presses": 0,     # key and mouse presses so far, wait_for_input wakes up when this changes
+        "exposes": 0      # times the window was uncovered and has to be drawn again
     }
     
-    # scroll index for current part
-    scroll_index = 0
-    visible_count = 5
+    def on_key_press(symbol, modifiers):
+        keyboard["down"][key_name(symbol)] = core.getTime()
+        keyboard["presses"] += 1
+    
+    def on_mouse_press(x, y, button, modifiers):
+        keyboard["down"]["mouse"] = core.getTime()
+        keyboard["presses"] += 1
+    
+    def on_mouse_release(x, y, button, modifiers):
+        keyboard["down"].pop("mouse", None)
+    
+    def on_key_release(symbol, modifiers):
+        name = key_name(symbol)
+        down_time = keyboard["down"].pop(name, None)
+        if down_time is not None:
+            keyboard["taps"][name] = down_time
+    
+    def on_expose():
+        keyboard["exposes"] += 1
+    
+    # the handlers return nothing, so psychopy's own event.getKeys() still sees every key
+    if hasattr(window.winHandle, "push_handlers"):
+        window.winHandle.push_handlers(on_key_press=on_key_press, on_key_release=on_key_release,
+                                       on_mouse_press=on_mouse_press, on_mouse_release=on_mouse_release,
+                                       on_expose=on_expose)
+        keyboard["events"] = True
+    return keyboard
+
+def key_name(symbol):
+    # pyglet key symbol --> psychopy key name ("up", "space", "escape", ...)
+    from pyglet.window import key
+    return key.symbol_string(symbol).lower()
+
+def pump_keyboard(keyboard):
+    # handle the key events that arrived since the last frame right now, not at the next flip
+    if keyboard["events"]:
+        window.winHandle.dispatch_events()
+        event.getKeys(keyList=["up", "down"]) # already handled, don't leave them in psychopy's buffer for the next screen
+    else:
+        for name, press_time in event.getKeys(keyList=["up", "down"], timeStamped=True):
+            keyboard["taps"][name] = press_time
+
+def sample_keys(keyboard, names):
+    # the keys of names that count as down for one physics tick (once per tick) --> the time each went down
+    down = {}
+    for name in names:
+        tap_time = keyboard["taps"].pop(name, None)
+        if name in keyboard["down"]:
+            down[name] = keyboard["down"][name]
+        elif tap_time is not None:
+            down[name] = tap_time
+    return down
+
+def release_keys(keyboard):
+    # forget everything held, for when a screen starts and keys may still be down from the last one
+    keyboard["down"].clear()
+    keyboard["taps"].clear()
 
-    # UI texts
-    title = visual.TextStim(window, text="Pumpkin Skin Store", pos=(0, 0.55), height=0.10, color="orange", bold=True)
-    instructions = visual.TextStim(window, text="Use ↑/↓ to switch part | ←/→ to scroll | SPACE to equip | ESC to exit", pos=(0, -0.8), height=0.05, color="gray")
-    part_text = visual.TextStim(window, text="", pos=(0, -0.65), height=0.08, color="white", bold=True)
-    unlock_text_object = visual.TextStim(window, height=0.03, bold=True)
+# ==============================================================================
+# latency measurement
+# ==============================================================================
+# python pumpkin.py --measure-latency
+# every input that changes the game is timestamped when it happened, when the game acted on it
+# and when the frame showing the result was flipped. per screen p50/p95/p99 are printed at exit
+# and all samples are written to latency.csv
+latency_measurement = "--measure-latency" in sys.argv
+latency_csv_path    = "latency.csv"
+
+latency_pending = [] # (screen, input, input time, update time) waiting for their frame
+latency_samples = [] # (screen, input, input time, update time, flip time)
+
+def record_latency(screen, input_name, input_time):
+    # call right after the game acted on an input
+    if latency_measurement:
+        latency_pending.append((screen, input_name, input_time, core.getTime()))
+
+def get_keys(screen, keyList=None):
+    # event.getKeys() that also records the keys' latencies when measuring
+    if not latency_measurement:
+        return event.getKeys(keyList=keyList)
+    keys_pressed = event.getKeys(keyList=keyList, timeStamped=True)
+    for name, press_time in keys_pressed:
+        record_latency(screen, name, press_time)
+    return [name for name, press_time in keys_pressed]
+
+def finish_latency_frame(flip_time):
+    # the inputs handled this frame are on screen now
+    for screen, input_name, input_time, update_time in latency_pending:
+        latency_samples.append((screen, input_name, input_time, update_time, flip_time))
+    latency_pending.clear()
+
+def latency_report():
+    # {(screen, input): {"count", "update_p50", ..., "photon_p99"}} in milliseconds
+    groups = collections.defaultdict(list)
+    for screen, input_name, input_time, update_time, flip_time in latency_samples:
+        groups[(screen, input_name)].append((update_time - input_time, flip_time - input_time))
     
-    while True:
-        title.draw()
-        instructions.draw()
-        
-        # current part
-        selected_part = parts_order[selected_part_index]
-        skins = part_skins[selected_part]
-        
-        # determine visible range for carousel
-        half_visible = visible_count // 2
-        total_skins = len(skins)
-        spacing = 0.35
-        
-        # draw carousel pumpkins
-        for offset in range(-half_visible, half_visible + 1):
-            index = scroll_index + offset
-            if 0 <= index < total_skins:
-                x = offset * spacing
-                y = 0.0
-                skin_name = skins[index]
-                skin_pumpkin = create_pumpkin(x, y, skin={**current_skin, selected_part: skin_name})
-                draw_pumpkin(skin_pumpkin)
-
-                # display unlock scores clearly
-                unlock_score = skin_unlock_scores[selected_part][skin_name]
-                unlocked = unlock_score <= pong_high_score
-                if unlocked:
-                    unlock_text_object.text = f"Unlocked!"
-                    unlock_text_object.color = "white"
-                else:
-                    unlock_text_object.text = f"Pong high score needed: {unlock_score}"
-                    unlock_text_object.color = "red"
-                    
-                unlock_text_object.pos = (x, y - 0.15)
-                unlock_text_object.draw()
-
-        # display current part
-        part_text.text = f"Editing: {selected_part.upper()}  |  Selected Skin: {skins[scroll_index]}"
-        part_text.draw()
-        
-        # handle input
-        keys = event.getKeys()
-        if 'up' in keys:
-            selected_part_index = (selected_part_index - 1) % len(parts_order)
-            scroll_index = 0
-        if 'down' in keys:
-            selected_part_index = (selected_part_index + 1) % len(parts_order)
-            scroll_index = 0
-        if 'left' in keys:
-            if scroll_index > 0:
-                scroll_index -= 1
-        if 'right' in keys:
-            if scroll_index < len(skins) - 1:
-                scroll_index += 1
-        if 'space' in keys or 'return' in keys:
-            # equip only if unlocked
-            unlock_score = skin_unlock_scores[selected_part][skins[scroll_index]]
-            if unlock_score <= pong_high_score:
-                current_skin[selected_part] = skins[scroll_index]
-                hit_sound.play()
-                core.wait(0.10+0.10)
-                hit_sound.play()
-            else:
-                lose_sound_1.play()
-                core.wait(0.30+0.10)
-                lose_sound_2.play()
-                core.wait(0.30+0.10)
-                lose_sound_3.play()
-        if 'escape' in keys:
-            return
-        
+    report = {}
+    for group, latencies in sorted(groups.items()):
+        latencies = numpy.array(latencies) * 1000
+        report[group] = {"count": len(latencies)}
+        for column, name in enumerate(["update", "photon"]):
+            for percentile in [50, 95, 99]:
+                report[group][f"{name}_p{percentile}"] = float(numpy.percentile(latencies[:, column], percentile))
+    return report
+
+def save_latency_measurement():
+    if not latency_samples:
+        return
+    with open(latency_csv_path, "w") as csv_file:
+        csv_file.write("screen,input,input_time,update_time,flip_time,update_ms,photon_ms\n")
+        for screen, input_name, input_time, update_time, flip_time in latency_samples:
+            csv_file.write(f"{screen},{input_name},{input_time:.6f},{update_time:.6f},{flip_time:.6f},"
+                           f"{(update_time - input_time) * 1000:.3f},{(flip_time - input_time) * 1000:.3f}\n")
+    
+    print("screen           input     count | input->update p50/p95/p99 ms | input->photon p50/p95/p99 ms")
+    for (screen, input_name), stats in latency_report().items():
+        print(f"{screen:16s} {input_name:8s} {stats['count']:6d} | "
+              f"{stats['update_p50']:7.1f} {stats['update_p95']:7.1f} {stats['update_p99']:7.1f}      | "
+              f"{stats['photon_p50']:7.1f} {stats['photon_p95']:7.1f} {stats['photon_p99']:7.1f}")
+    print(f"{len(latency_samples)} samples written to {latency_csv_path}")
+
+if latency_measurement:
+    atexit.register(save_latency_measurement) # core.quit() exits through sys.exit, so this still runs
+
+# ==============================================================================
+# frame profiler
+# ==============================================================================
+# F3 toggles a HUD with the frame time, dropped frames, the update/draw/flip split of the
+# active screen and how many psychopy stimuli were created per frame.
+# python pumpkin.py --profile records every frame and writes them as a chrome trace to
+# profile_trace.json at exit (open it in chrome://tracing or ui.perfetto.dev)
+profiler_recording   = "--profile" in sys.argv
+profiler_trace_path  = "profile_trace.json"
+profiler_hud_refresh = 0.25 # seconds between HUD text updates, re-laying out the text every frame would show up in the HUD
+
+profiler = {
+    "hud": False,
+    "started": False,
+    "frame_start": None,  # when the previous flip returned
+    "update_end": None,   # when this frame's input & logic were done
+    "stims_created": 0,   # stimuli created since the previous flip
+    "dropped_frames": 0,
+    "recent": collections.deque(maxlen=60), # (frame, update, draw, flip, stims created) of the last frames for the HUD
+    "frames": [],         # when recording: (screen, frame start, update end, draw end, flip end, stims created)
+    "hud_text": None,
+    "hud_updated": 0.0
+}
+
+def profiling():
+    return profiler["hud"] or profiler_recording
+
+def start_profiler():
+    # counts every stimulus created from now on, they all go through MinimalStim.__init__
+    if profiler["started"]:
+        return
+    profiler["started"] = True
+    
+    from psychopy.visual.basevisual import MinimalStim
+    original_init = MinimalStim.__init__
+    
+    @functools.wraps(original_init)
+    def counting_init(self, *args, **kwargs):
+        profiler["stims_created"] += 1
+        original_init(self, *args, **kwargs)
+    MinimalStim.__init__ = counting_init
+    
+    profiler["hud_text"] = visual.TextStim(window, text="", pos=(-0.98, 0.98), height=0.04, color='lime',
+                                           anchorHoriz='left', anchorVert='top', alignText='left')
+
+def toggle_profiler_hud():
+    profiler["hud"] = not profiler["hud"]
+    start_profiler()
+
+def mark_update_done():
+    # call between a screen's input & logic and its drawing, the rest until the flip counts as draw time
+    if profiling():
+        profiler["update_end"] = core.getTime()
+
+def draw_profiler_hud(screen):
+    now = core.getTime()
+    if now - profiler["hud_updated"] >= profiler_hud_refresh and profiler["recent"]:
+        profiler["hud_updated"] = now
+        frame, update, draw, flip, stims = numpy.mean(profiler["recent"], axis=0)
+        profiler["hud_text"].text = (f"{screen}  {frame * 1000:5.1f} ms ({1 / frame:3.0f} FPS)  dropped {profiler['dropped_frames']}\n"
+                                     f"update {update * 1000:4.1f}  draw {draw * 1000:4.1f}  flip {flip * 1000:4.1f} ms\n"
+                                     f"{stims:.1f} stimuli created per frame")
+    profiler["hud_text"].draw()
+
+def present_frame(screen):
+    # window.flip() for every screen, the frame is on screen once it returns
+    if not profiling():
         window.flip()
-        core.wait(1/60.0)
+        if latency_pending:
+            finish_latency_frame(core.getTime())
+        if startup["pending"]:
+            run_startup_step()
+        return
+    
+    if profiler["hud"]:
+        draw_profiler_hud(screen)
+    draw_end = core.getTime()
+    window.flip()
+    flip_end = core.getTime()
+    if latency_pending:
+        finish_latency_frame(flip_end)
+    
+    # a frame runs from the previous flip to this one: update, then draw, then waiting in flip
+    frame_start = profiler["frame_start"] if profiler["frame_start"] is not None else draw_end
+    update_end  = profiler["update_end"]
+    if update_end is None or not frame_start <= update_end <= draw_end:
+        update_end = frame_start # screens without a mark count everything as drawing
+    stims_created = profiler["stims_created"]
+    
+    frame_time = flip_end - frame_start
+    if frame_time > 1.5 / get_refresh_rate():
+        profiler["dropped_frames"] += 1
+    profiler["recent"].append((frame_time, update_end - frame_start, draw_end - update_end, flip_end - draw_end, stims_created))
+    if profiler_recording:
+        profiler["frames"].append((screen, frame_start, update_end, draw_end, flip_end, stims_created))
+    
+    profiler["frame_start"]   = flip_end
+    profiler["update_end"]    = None
+    profiler["stims_created"] = 0
+    if startup["pending"]:
+        run_startup_step()
+
+def save_profiler_trace():
+    # chrome trace event format, times in microseconds: one slice per frame with its three phases inside
+    events = []
+    for screen, frame_start, update_end, draw_end, flip_end, stims_created in profiler["frames"]:
+        for name, start, end in [(screen, frame_start, flip_end), ("update", frame_start, update_end),
+                                 ("draw", update_end, draw_end), ("flip", draw_end, flip_end)]:
+            events.append({"name": name, "cat": screen, "ph": "X", "pid": 1, "tid": 1, "ts": start * 1e6, "dur": (end - start) * 1e6})
+        events.append({"name": "stimuli created", "ph": "C", "pid": 1, "ts": frame_start * 1e6, "args": {"stimuli": stims_created}})
+        events.append({"name": "frame time (ms)", "ph": "C", "pid": 1, "ts": frame_start * 1e6, "args": {"frame": (flip_end - frame_start) * 1000}})
+    
+    with open(profiler_trace_path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+    print(f"{len(profiler['frames'])} frames written to {profiler_trace_path}")
 
+# ==============================================================================
+# animations
+# ==============================================================================
+# animations are declared as keyframe tracks, sampled into numpy tables once and played by
+# elapsed time, so a frame only looks its values up and nothing blocks while they play
+animation_sample_rate = 240 # table samples per second
+
+easings = {
+    "linear":      lambda t: t,
+    "sine_in":     lambda t: 1 - numpy.cos(t * numpy.pi / 2),
+    "sine_out":    lambda t: numpy.sin(t * numpy.pi / 2),
+    "sine_in_out": lambda t: 0.5 - 0.5 * numpy.cos(t * numpy.pi),
+    "exponential": lambda t: t # linear, but between the logs of the values (see sample_track)
+}
+
+def wave_keyframes(amplitude, period, duration):
+    # a sine wave as keyframes: a zero or a peak every quarter period, sine eased in between
+    quarter_values = [0, +1, 0, -1]
+    keyframes = []
+    for quarter in range(int(round(duration / (period / 4))) + 1):
+        easing = "sine_out" if quarter % 2 == 0 else "sine_in"
+        keyframes.append((quarter * period / 4, amplitude * quarter_values[quarter % 4], easing))
+    return tuple(keyframes)
+
+# tracks are (time, value, easing towards the next keyframe) keyframes
+animations = {
+    # pong game over: grows 4% and fades 1/80 per 60 FPS frame while rumbling, for 80 frames
+    "game_over": {
+        "loop": False,
+        "tracks": {
+            "scale":    ((0.0, 1.04, "exponential"), (80 / 60.0, 1.04 ** 81, "linear")),
+            "rotation": wave_keyframes(13, period=10 / 60.0, duration=80 / 60.0),
+            "opacity":  ((0.0, 0.0, "linear"), (80 / 60.0, 1.0, "linear"))
+        }
+    },
+    # start menu pumpkins: 0.08 * sin(frame / 20) at 60 FPS
+    "menu_bounce": {
+        "loop": True,
+        "tracks": {
+            "position_y": wave_keyframes(0.08, period=2 * math.pi / 3, duration=2 * math.pi / 3)
+        }
+    }
+}
+
+def sample_track(keyframes, times):
+    # holds the first value before the first keyframe and the last one after the last keyframe
+    values = numpy.full(len(times), float(keyframes[-1][1]))
+    values[times < keyframes[0][0]] = keyframes[0][1]
+    for (start, start_value, easing), (end, end_value, next_easing) in zip(keyframes, keyframes[1:]):
+        inside = (times >= start) & (times < end)
+        t = easings[easing]((times[inside] - start) / (end - start))
+        if easing == "exponential":
+            values[inside] = start_value * (end_value / start_value) ** t
+        else:
+            values[inside] = start_value + (end_value - start_value) * t
+    return values
+
+@functools.lru_cache(maxsize=None)
+def animation_tables(name):
+    # every track sampled once, shared by every screen that plays this animation
+    tracks = animations[name]["tracks"]
+    duration = max(keyframes[-1][0] for keyframes in tracks.values())
+    times = numpy.arange(int(math.ceil(duration * animation_sample_rate)) + 2) / animation_sample_rate
+    tables = {}
+    for track, keyframes in tracks.items():
+        tables[track] = sample_track(keyframes, times)
+        tables[track].flags.writeable = False
+    return duration, tables
+
+def start_animation(name):
+    duration, tables = animation_tables(name)
+    return {
+        "clock": core.Clock(),
+        "duration": duration,
+        "loop": animations[name]["loop"],
+        "tables": tables,
+        "stop_time": None # set by settle_animation
+    }
+
+def settle_animation(animation):
+    # a looping animation plays to the end of its current loop, then holds its first values
+    if animation["stop_time"] is None:
+        elapsed = animation["clock"].getTime()
+        animation["stop_time"] = (elapsed // animation["duration"] + 1) * animation["duration"]
+
+def resume_animation(animation):
+    if animation["stop_time"] is None:
+        return
+    if animation["clock"].getTime() >= animation["stop_time"]:
+        animation["clock"].reset() # it rests on its first values, so it carries on from the start
+    animation["stop_time"] = None
+
+def animation_finished(animation):
+    elapsed = animation["clock"].getTime()
+    if animation["stop_time"] is not None and elapsed >= animation["stop_time"]:
+        return True
+    return not animation["loop"] and elapsed >= animation["duration"]
+
+def animation_values(animation):
+    # every track's value right now, interpolated between the two nearest table samples
+    elapsed = animation["clock"].getTime()
+    if animation["stop_time"] is not None:
+        elapsed = min(elapsed, animation["stop_time"])
+    if animation["loop"]:
+        elapsed %= animation["duration"]
+    position = min(elapsed, animation["duration"]) * animation_sample_rate
+    index    = int(position)
+    fraction = position - index
+    values = {}
+    for track, table in animation["tables"].items():
+        values[track] = float(table[index] + (table[index + 1] - table[index]) * fraction)
+    return values
+
+def animate_pumpkin(pumpkin, values, x, y):
+    # applies the tracks a pumpkin understands, position tracks are offsets from (x, y)
+    if "scale" in values:
+        set_pumpkin_scale(pumpkin, values["scale"])
+    if "rotation" in values:
+        set_pumpkin_rotation(pumpkin, values["rotation"])
+    update_pumpkin_position(pumpkin, x + values.get("position_x", 0.0), y + values.get("position_y", 0.0))
 
 # ==============================================================================
-# pong difficulty menu
+# static background layers
+# ==============================================================================
+background_layers = {} # name --> full window texture of everything static on that screen
+
+def get_background_layer(name, create_stims):
+    # renders the static stimuli once into one full window texture, afterwards it's one draw per frame.
+    # BufferImageStim clears the back buffer, so the first call for a name has to happen between frames
+    if name not in background_layers:
+        background_layers[name] = visual.BufferImageStim(window, stim=create_stims())
+    return background_layers[name]
+
+# ==============================================================================
+# retained scenes
 # ==============================================================================
-def pong_difficulty_menu():
-    options = ["Easy  ", "Medium  ", "Hard  "] # 2 spaces as  suffix needed because I add 2 characters as a prefix later on
-    speed = [0.010, 0.014, 0.020]
-    selected_option = 1 # defaults to medium difficulty
-    title = visual.TextStim(window, text="Select your difficulty:", pos=(0, 0.55), height=0.12, color='orange', bold = True)
-    instructions = visual.TextStim(window, text="Use ↑/↓ to navigate | SPACE to select | ESC to quit", pos=(0, -0.8), height=0.05, color='gray')
+# a screen nobody touches looks the same frame after frame. a scene is the list of things a
+# screen draws, each with a state() that changes whenever it would look different. present_scene
+# only draws and flips when some state changed since the frame on screen, otherwise it sleeps
+# until a key or mouse press arrives (or idle_timeout passes), so idle screens use next to no CPU
+idle_input_timeout = 0.25  # seconds an idle screen sleeps before it looks at its state again
+idle_poll_interval = 0.005 # seconds between looking for window events while sleeping
+
+def wait_for_input(timeout):
+    # sleeps until the window gets a key or mouse press or has to be redrawn, at most timeout.
+    # the press stays in psychopy's event buffer for the screen's next event.getKeys()
+    keyboard = get_keyboard_state()
+    if not keyboard["events"]:
+        time.sleep(idle_poll_interval) # no window events to wait for, just don't spin
+        return
+    inputs = (keyboard["presses"], keyboard["exposes"])
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        window.winHandle.dispatch_events()
+        if (keyboard["presses"], keyboard["exposes"]) != inputs:
+            return
+        time.sleep(idle_poll_interval) # not core.wait(), that busy-waits its last 0.2 s
+
+def create_scene(screen, elements):
+    # elements: [(draw, state)] in drawing order, state None for things that never change
+    return {"screen": screen, "elements": elements, "drawn": None}
+
+def scene_state(scene):
+    return (get_keyboard_state()["exposes"], tuple(state() for draw, state in scene["elements"] if state is not None))
+
+def present_scene(scene, idle_timeout=idle_input_timeout):
+    # draws the scene and flips if it would look different from the frame on screen, otherwise
+    # waits for input. returns True if a new frame was flipped
+    state = scene_state(scene)
+    if state == scene["drawn"] and not profiler["hud"] and not startup["pending"]:
+        # inputs that changed nothing are on screen already, they shouldn't wait for the next real flip
+        if latency_pending:
+            finish_latency_frame(core.getTime())
+        wait_for_input(idle_timeout)
+        if profiling():
+            profiler["frame_start"] = core.getTime() # the next frame starts now, the idle wait isn't part of it
+        return False
+    for draw, element_state in scene["elements"]:
+        draw()
+    present_frame(scene["screen"])
+    scene["drawn"] = state
+    return True
+
+def invalidate_scene(scene):
+    # the next present_scene draws, e.g. when a screen comes back and the window still shows the last one
+    scene["drawn"] = None
+
+# ==============================================================================
+# screen manager
+# ==============================================================================
+# every screen is a set of hooks: create fills its resources on the first visit, enter starts
+# a visit and returns its state, update handles input & logic once per frame and returns None
+# to stay or (next screen, arguments), draw draws the frame and presents it, exit cleans up.
+# the resources stay for the whole game, so coming back to a screen doesn't build its
+# stimuli again, enter only re-skins or resets what a visit changes
+screens          = {} # name --> {"create", "enter", "update", "draw", "exit"}
+screen_resources = {} # name --> resources of that screen, from its first visit on
+
+# what the screens share between visits
+session = {
+    "pong_high_score": 0,
+    "squash_high_score": 0,
+    "home": "start_menu" # where "back to the menu" goes, None ends the game (e.g. after a replay)
+}
 
+def register_screen(name, create, enter, update, draw, exit=None):
+    screens[name] = {"create": create, "enter": enter, "update": update, "draw": draw, "exit": exit}
+
+def screen_resource(resources, key, create):
+    # a resource only some visits need (e.g. one per difficulty), built the first time it's asked for
+    if key not in resources:
+        resources[key] = create()
+    return resources[key]
+
+def get_screen_resources(name):
+    # creates them on the first call, like get_background_layer only between frames
+    if name not in screen_resources:
+        screen_resources[name] = {}
+        screens[name]["create"](screen_resources[name])
+    return screen_resources[name]
+
+def run_screen(name, **arguments):
+    # one visit of a screen, returns (next screen, arguments)
+    screen = screens[name]
+    resources = get_screen_resources(name)
+    
+    state = screen["enter"](resources, **arguments)
     while True:
-        # drawing the normal texts
-        title.draw()
-        instructions.draw()
-        
-        # menu selection
-        menu_option_spacing = 0.12
-        for index, option in enumerate(options):
-            if index == selected_option:
-                prefix = "> "
-            else:
-                prefix = "  "
-            menu_option = visual.TextStim(window, text=f"{prefix}{option}", pos=(0, 0.15 - index*menu_option_spacing), height=0.07, color='white', italic=True)
-            menu_option.draw()
+        transition = screen["update"](resources, state)
+        if transition is not None:
+            break
+        mark_update_done()
+        screen["draw"](resources, state)
+    if screen["exit"] is not None:
+        screen["exit"](resources, state)
+    return transition
+
+def run_screens(name, **arguments):
+    # every screen says which one comes next, until one says None
+    while name is not None:
+        name, arguments = run_screen(name, **arguments)
+
+def go_home():
+    return (session["home"], {})
+
+# ==============================================================================
+# menu widget
+# ==============================================================================
+menu_text_cache = {} # (text, y) --> TextStim, shared by every menu so each glyph layout happens once
+
+def get_menu_text(text, y):
+    key = (text, y)
+    if key not in menu_text_cache:
+        menu_text_cache[key] = visual.TextStim(window, text=text, pos=(0, y), height=0.07, color='white', italic=True)
+    return menu_text_cache[key]
+
+def create_menu(options, selected_option=0):
+    # lay out both the "> " and the "  " variant of every option up front
+    menu_option_spacing = 0.12
+    option_stims = []
+    for index, option in enumerate(options):
+        y = 0.15 - index * menu_option_spacing # index*0.12 --> controls y_space between menu options
+        option_stims.append({
+            True:  get_menu_text(f"> {option}", y),
+            False: get_menu_text(f"  {option}", y)
+        })
+    return {"options": options, "selected_option": selected_option, "option_stims": option_stims}
+
+def draw_menu(menu):
+    # moving the selection only changes which prebuilt variant gets drawn
+    for index, stims in enumerate(menu["option_stims"]):
+        stims[index == menu["selected_option"]].draw()
+
+def handle_menu_keys(menu, keys_pressed):
+    # returns "select", "escape" or None
+    if 'up' in keys_pressed:
+        menu["selected_option"] = (menu["selected_option"] - 1) % len(menu["options"])
+    if 'down' in keys_pressed:
+        menu["selected_option"] = (menu["selected_option"] + 1) % len(menu["options"])
+    if 'space' in keys_pressed or 'return' in keys_pressed:
+        return "select"
+    if 'escape' in keys_pressed:
+        return "escape"
+    return None
 
+def register_menu_screen(name, options, selected_option, title, choose):
+    # a screen that is only a title and a menu. choose(selected option, state) returns where to
+    # go next, the state holds the screen's arguments. ESC goes back to the start menu
+    def create(resources):
+        resources["menu"] = create_menu(options, selected_option)
+        
+        # static texts, rendered once into a background layer
+        resources["background"] = get_background_layer(name, lambda: [
+            visual.TextStim(window, text=title, pos=(0, 0.55), height=0.12, color='orange', bold = True),
+            visual.TextStim(window, text="Use ↑/↓ to navigate | SPACE to select | ESC to quit", pos=(0, -0.8), height=0.05, color='gray')
+        ])
+        menu = resources["menu"]
+        resources["scene"] = create_scene(name, [
+            (resources["background"].draw, None), # the normal texts
+            (lambda: draw_menu(menu),      lambda: menu["selected_option"]) # menu selection
+        ])
+    
+    def enter(resources, **arguments):
+        resources["menu"]["selected_option"] = selected_option
+        invalidate_scene(resources["scene"])
+        return arguments
+    
+    def update(resources, state):
         # get key inputs
-        keys_pressed = event.getKeys()
-        if 'up' in keys_pressed:
-            selected_option = (selected_option - 1) % len(options)
-        if 'down' in keys_pressed:
-            selected_option = (selected_option + 1) % len(options)
-        if 'space' in keys_pressed or 'return' in keys_pressed:
-            return speed[selected_option]
-        if 'escape' in keys_pressed:
-            return None
+        menu_action = handle_menu_keys(resources["menu"], get_keys(name))
+        if menu_action == "select":
+            return choose(resources["menu"]["selected_option"], state)
+        if menu_action == "escape":
+            return go_home()
+        return None
+    
+    def draw(resources, state):
+        # redraws and flips only when the selection moved, flip() waits for vsync
+        present_scene(resources["scene"])
+    
+    register_screen(name, create, enter, update, draw)
+
+# ==============================================================================
+# start menu
+# ==============================================================================
+menu_idle_time = 10.0 # seconds without a key press until the start menu pumpkins stop bouncing
+
+# the screen each start menu option goes to
+start_menu_choices = ["pong_difficulty_menu", "music_screen", "squash_difficulty_menu", "skin_store"]
+
+def create_start_menu(resources):
+    # menu options
+    menu_options = ["Play PONG  ", "Listen to Music  ", "Squash Squash  ", "Skin Store  "] # 2 spaces as a suffix needed because I add 2 characters as a prefix later on
+    resources["menu"] = create_menu(menu_options, selected_option=0)
+    
+    # create menu text (static, rendered once into a background layer)
+    resources["background"] = get_background_layer("start_menu", lambda: [
+        visual.TextStim(window, text="Happy Halloween!", pos=(0, 0.55), height=0.12, color='orange', bold=True),
+        visual.TextStim(window, text="Use ↑/↓ to navigate | SPACE to select | ESC to quit", pos=(0, -0.8), height=0.05, color='gray')
+    ])
+    
+    # create the menu pumpkins
+    menu_pumpkin_left  = resources["pumpkin_left"]  = create_pumpkin(-0.6, 0)
+    menu_pumpkin_right = resources["pumpkin_right"] = create_pumpkin(+0.6, 0)
+    set_pumpkin_scale(menu_pumpkin_left,  1.15)
+    set_pumpkin_scale(menu_pumpkin_right, 1.15)
+    
+    # the background layer goes first, it covers the whole window
+    menu = resources["menu"]
+    resources["scene"] = create_scene("start_menu", [
+        (resources["background"].draw,             None),
+        (lambda: draw_pumpkin(menu_pumpkin_left),  lambda: menu_pumpkin_left.pumpkin_y_position),
+        (lambda: draw_pumpkin(menu_pumpkin_right), lambda: menu_pumpkin_right.pumpkin_y_position),
+        (lambda: draw_menu(menu),                  lambda: menu["selected_option"])
+    ])
+
+def enter_start_menu(resources):
+    event.clearEvents() # keys the last screen didn't ask for would move the selection
+    resources["menu"]["selected_option"] = 0
+    set_pumpkin_skin(resources["pumpkin_left"],  current_skin) # the skin may have changed in the store
+    set_pumpkin_skin(resources["pumpkin_right"], current_skin)
+    invalidate_scene(resources["scene"])
+    
+    # pumpkin menu bounce
+    return {"bounce": start_animation("menu_bounce"), "last_input_time": core.getTime()}
+
+def update_start_menu(resources, state):
+    # get key inputs
+    keys_pressed = get_keys("start_menu")
+    menu_action = handle_menu_keys(resources["menu"], keys_pressed)
+    if menu_action == "select":
+        return (start_menu_choices[resources["menu"]["selected_option"]], {})
+    if menu_action == "escape":
+        return (None, {}) # quits the game
+    
+    # the pumpkins come to rest when nobody uses the menu, then the menu stops drawing
+    bounce = state["bounce"]
+    if keys_pressed:
+        state["last_input_time"] = core.getTime()
+        resume_animation(bounce)
+    elif core.getTime() - state["last_input_time"] > menu_idle_time:
+        settle_animation(bounce)
+    
+    # bouncing the menu pumpkins
+    y_offset = animation_values(bounce)["position_y"]
+    update_pumpkin_position(resources["pumpkin_left"],  -0.6, +y_offset)
+    update_pumpkin_position(resources["pumpkin_right"], +0.6, -y_offset)
+    return None
+
+def draw_start_menu(resources, state):
+    # redraws and flips only if something moved, flip() waits for vsync
+    present_scene(resources["scene"])
+
+register_screen("start_menu", create_start_menu, enter_start_menu, update_start_menu, draw_start_menu)
+
+# ==============================================================================
+# skin store tables
+# ==============================================================================
+# order of pumpkin parts to edit, the skins of each part in store order and their unlock
+# scores, all from skins.json
+parts_order        = [] # filled by load_skin_table()
+part_skins         = {}
+skin_unlock_scores = {}
+
+# ==============================================================================
+# skin store carousel
+# ==============================================================================
+def create_skin_carousel(visible_count=5, spacing=0.35):
+    # one preview pumpkin + unlock text per visible slot, built once and re-skinned later
+    half_visible = visible_count // 2
+    offsets = list(range(-half_visible, half_visible + 1))
+    return {
+        "offsets": offsets,
+        "pumpkins": [create_pumpkin(offset * spacing, 0.0) for offset in offsets], # drawn part by part until the thumbnail is ready
+        "unlock_texts": [visual.TextStim(window, text="", pos=(offset * spacing, -0.15), height=0.03, bold=True) for offset in offsets],
+        "skin_keys": [None] * len(offsets),
+        "visible": [False] * len(offsets),
+        "state": None # (part, scroll index, equipped skin, high score) the slots were last built for
+    }
+
+def store_neighbor_skins(selected_part, scroll_index, visible_count=5):
+    # skin keys the store shows now or after one more key press: the current part scrolled one
+    # step either way, and the part above and below at scroll 0. visible ones first
+    half_visible = visible_count // 2
+    skins = part_skins[selected_part]
+    visible = range(max(0, scroll_index - half_visible), min(len(skins), scroll_index + half_visible + 1))
+    scrolled = [scroll_index - half_visible - 1, scroll_index + half_visible + 1]
+    skin_keys = [pumpkin_skin_key({**current_skin, selected_part: skins[index]})
+                 for index in [*visible, *scrolled] if 0 <= index < len(skins)]
+    
+    part_index = parts_order.index(selected_part)
+    for step in (-1, +1):
+        part = parts_order[(part_index + step) % len(parts_order)]
+        skin_keys += [pumpkin_skin_key({**current_skin, part: skin_name}) for skin_name in part_skins[part][:half_visible + 1]]
+    return skin_keys
+
+def update_skin_carousel(carousel, selected_part, scroll_index, pong_high_score):
+    # only touch the stimuli when something the previews depend on has changed
+    state = (selected_part, scroll_index, pumpkin_skin_key(current_skin), pong_high_score)
+    if state == carousel["state"]:
+        return False
+    carousel["state"] = state
+    
+    # every equip changes all previews, the worker renders the next ones while this view is up
+    request_skin_thumbnails(store_neighbor_skins(selected_part, scroll_index, len(carousel["offsets"])))
+    
+    skins = part_skins[selected_part]
+    for slot, offset in enumerate(carousel["offsets"]):
+        index = scroll_index + offset
+        carousel["visible"][slot] = 0 <= index < len(skins)
+        if not carousel["visible"][slot]:
+            continue
         
-        # update the window at 60 FPS
-        window.flip()
-        core.wait(1/60.0)
+        skin_name = skins[index]
+        carousel["skin_keys"][slot] = pumpkin_skin_key({**current_skin, selected_part: skin_name})
+        
+        # display unlock scores clearly
+        unlock_text_object = carousel["unlock_texts"][slot]
+        unlock_score = skin_unlock_scores[selected_part][skin_name]
+        if unlock_score <= pong_high_score:
+            unlock_text_object.text = f"Unlocked!"
+            unlock_text_object.color = "white"
+        else:
+            unlock_text_object.text = f"Pong high score needed: {unlock_score}"
+            unlock_text_object.color = "red"
+    return True
+
+def draw_skin_carousel(carousel):
+    for slot in range(len(carousel["offsets"])):
+        if carousel["visible"][slot]:
+            pumpkin  = carousel["pumpkins"][slot]
+            skin_key = carousel["skin_keys"][slot]
+            if not draw_skin_thumbnail(skin_key, pumpkin.pumpkin_x_position, pumpkin.pumpkin_y_position):
+                # not rendered yet --> the slot's own pumpkin, re-skinned
+                if pumpkin.skin != skin_key:
+                    set_pumpkin_skin(pumpkin, dict(zip(parts_order, skin_key)))
+                draw_pumpkin(pumpkin)
+            carousel["unlock_texts"][slot].draw()
+
+# ==============================================================================
+# skin store
+# ==============================================================================
+def create_skin_store(resources):
+    carousel = resources["carousel"] = create_skin_carousel(visible_count=5)
+
+    # UI texts (the static ones are rendered once into a background layer)
+    resources["background"] = get_background_layer("skin_store", lambda: [
+        visual.TextStim(window, text="Pumpkin Skin Store", pos=(0, 0.55), height=0.10, color="orange", bold=True),
+        visual.TextStim(window, text="Use ↑/↓ to switch part | ←/→ to scroll | SPACE to equip | ESC to exit", pos=(0, -0.8), height=0.05, color="gray")
+    ])
+    part_text = resources["part_text"] = visual.TextStim(window, text="", pos=(0, -0.65), height=0.08, color="white", bold=True)
+    resources["scene"] = create_scene("skin_store", [
+        (resources["background"].draw,         None),
+        (lambda: draw_skin_carousel(carousel), lambda: (carousel["state"], tuple(skin_key in skin_thumbnail_cache for skin_key in carousel["skin_keys"]))),
+        (part_text.draw,                       lambda: part_text.text) # display current part
+    ])
+
+def enter_skin_store(resources):
+    event.clearEvents()
+    invalidate_scene(resources["scene"])
+    
+    # selected part and scroll index for current part
+    return {"selected_part_index": 0, "scroll_index": 0}
+
+def update_skin_store(resources, state):
+    pong_high_score = session["pong_high_score"]
+    
+    # current part
+    selected_part = parts_order[state["selected_part_index"]]
+    skins = part_skins[selected_part]
+    
+    # handle input (before drawing, so the frame drawn below already shows it)
+    keys = get_keys("skin_store")
+    if 'up' in keys:
+        state["selected_part_index"] = (state["selected_part_index"] - 1) % len(parts_order)
+        state["scroll_index"] = 0
+    if 'down' in keys:
+        state["selected_part_index"] = (state["selected_part_index"] + 1) % len(parts_order)
+        state["scroll_index"] = 0
+    if 'left' in keys:
+        if state["scroll_index"] > 0:
+            state["scroll_index"] -= 1
+    if 'right' in keys:
+        if state["scroll_index"] < len(skins) - 1:
+            state["scroll_index"] += 1
+    if 'space' in keys or 'return' in keys:
+        # equip only if unlocked
+        unlock_score = skin_unlock_scores[selected_part][skins[state["scroll_index"]]]
+        if unlock_score <= pong_high_score:
+            current_skin[selected_part] = skins[state["scroll_index"]]
+            play_sound_sequence(equip_sound_sequence)
+        else:
+            play_sound_sequence(deny_sound_sequence)
+    if 'escape' in keys:
+        return go_home()
+    
+    # the part may have changed
+    selected_part = parts_order[state["selected_part_index"]]
+    skins = part_skins[selected_part]
+    
+    # re-skin the carousel pumpkins only when the part or scroll index changed
+    if update_skin_carousel(resources["carousel"], selected_part, state["scroll_index"], pong_high_score):
+        resources["part_text"].text = f"Editing: {selected_part.upper()}  |  Selected Skin: {skins[state['scroll_index']]}"
+    upload_skin_thumbnails()
+    return None
+
+def draw_skin_store(resources, state):
+    # redraws and flips only if something changed, while thumbnails are on their way it looks every frame
+    present_scene(resources["scene"], idle_timeout=1 / 60.0 if thumbnail_worker["requested"] else idle_input_timeout)
+
+register_screen("skin_store", create_skin_store, enter_skin_store, update_skin_store, draw_skin_store)
+
+# ==============================================================================
+# pong difficulty menu
+# ==============================================================================
+register_menu_screen("pong_difficulty_menu", ["Easy  ", "Medium  ", "Hard  "], # 2 spaces as  suffix needed because I add 2 characters as a prefix later on
+                     selected_option=1, # defaults to medium difficulty
+                     title="Select your difficulty:",
+                     choose=lambda option, state: ("pong", {"ball_speed_x": pong_sim.difficulty_speeds[option]}))
 
 # ==============================================================================
 # music score
 # ==============================================================================
+# (note, octave, beats), None is a rest
+spooky_melody = (
+    ("F", 5, 1.0), ("F", 5, 1.0), ("E", 5, 1.0), ("E", 5, 1.0),
+    ("A", 4, 1.0), ("C", 5, 0.5), ("A", 4, 1.5),
+    ("A", 4, 1.0),
+    ("F", 5, 0.5), ("F", 5, 1.5), ("E", 5, 1.0), ("E", 5, 1.0),
+    ("A", 4, 1.0), (None, None, 3.0),
+    ("F", 5, 1.0), ("F", 5, 1.0), ("E", 5, 1.0), ("E", 5, 1.0),
+    ("A", 4, 1.0), ("C", 5, 1.0), ("A", 4, 2.0),
+    ("C", 5, 1.0), ("D", 5, 1.0), ("B", 4, 1.5), ("C", 5, 0.5),
+    ("A", 4, 4.0)
+)
+note_gap = 0.1 # silence after every note, in seconds
+
+@functools.lru_cache(maxsize=8)
+def render_track(melody, tempo):
+    # sequences the whole melody into one buffer, every note lands on its exact sample
+    track_length = sum(beats * tempo + note_gap for note, octave, beats in melody)
+    track = numpy.zeros(int(math.ceil(track_length * audio_sample_rate)))
+    
+    cursor = 0.0
+    for note, octave, beats in melody:
+        if note is not None:
+            tone = get_tone(note, octave, beats * tempo)
+            start = int(round(cursor * audio_sample_rate))
+            track[start:start + len(tone)] += tone
+        cursor += beats * tempo + note_gap
+    
+    track.flags.writeable = False
+    return track
+
+@functools.lru_cache(maxsize=8)
+def get_music_track(tempo):
+    return sound.Sound(value=render_track(spooky_melody, tempo), sampleRate=audio_sample_rate)
+
 def spooky_music(tempo):
-    # play a sequence of spooky sounds
-    la3 = sound.Sound('A', octave=4, secs=tempo)
-    la3_point = sound.Sound('A', octave=4, secs=tempo*1.5)
-    la3_long = sound.Sound('A', octave=4, secs=tempo*2)
-    la3_loong = sound.Sound('A', octave=4, secs=tempo*4)
-    si3_point = sound.Sound('B', octave=4, secs=tempo*1.5)
-    do4 = sound.Sound('C', octave=5, secs=tempo)
-    do4_half = sound.Sound('C', octave=5, secs=tempo/2)
-    re4 = sound.Sound('D', octave=5, secs=tempo)
-    mi4 = sound.Sound('E', octave=5, secs=tempo)
-    fa4 = sound.Sound('F', octave=5, secs=tempo)
-    fa4_half = sound.Sound('F', octave=5, secs=tempo/2)
-    fa4_point = sound.Sound('F', octave=5, secs=tempo*1.5)
-
-    sequence = [
-        (fa4, tempo), (fa4, tempo), (mi4, tempo), (mi4, tempo),
-        (la3, tempo), (do4_half, tempo/2), (la3_point, tempo*1.5),
-        (la3, tempo),
-        (fa4_half, tempo/2), (fa4_point, tempo*1.5), (mi4, tempo), (mi4, tempo),
-        (la3, tempo), (0, 3*tempo),
-        (fa4, tempo), (fa4, tempo), (mi4, tempo), (mi4, tempo),
-        (la3, tempo), (do4, tempo), (la3_long, tempo*2),
-        (do4, tempo), (re4, tempo), (si3_point, tempo*1.5), (do4_half, tempo/2),
-        (la3_loong, tempo*4)
-    ]
-
-    for note, wait_time in sequence:
-        if note != 0:
-            note.play()
-        core.wait(wait_time + 0.1)
+    # starts the spooky song and returns how long it plays, in seconds
+    get_music_track(tempo).play()
+    return len(render_track(spooky_melody, tempo)) / audio_sample_rate
 
 # ==============================================================================
 # music screen
 # ==============================================================================
-def music_screen():
-    # make the screen empty
-    window.clearBuffer()
-    
+def create_music_screen(resources):
     # create grid variables
     grid_rows = 4
     grid_columns = 5
@@ -453,7 +1573,7 @@ def music_screen():
     start_y = +( (grid_rows    - 1) * cell_spacing ) / 2
     
     # create and update the music pumpkin
-    music_pumpkins = []
+    music_pumpkins = resources["pumpkins"] = []
     for row in range(grid_rows):
         for column in range(grid_columns):
             x = start_x + column * cell_spacing
@@ -461,329 +1581,314 @@ def music_screen():
             pumpkin = create_pumpkin(x, y)
             update_pumpkin_position(pumpkin, x, y)
             music_pumpkins.append(pumpkin)
-            
-    # draw the music pumpkins
-    for index in range(len(music_pumpkins)):
-        draw_pumpkin(music_pumpkins[index])
-    window.flip()
     
-    # play the music
-    spooky_music(0.3)
+    # the music pumpkins stand still while it plays, so they're drawn once and the screen waits for ESC
+    resources["scene"] = create_scene("music_screen", [
+        (lambda: draw_pumpkin_batch(music_pumpkins), None) # same number of draw calls for 20 pumpkins as for 1
+    ])
+
+def enter_music_screen(resources):
+    # make the screen empty
+    window.clearBuffer()
+    for pumpkin in resources["pumpkins"]:
+        set_pumpkin_skin(pumpkin, current_skin) # the skin may have changed in the store
+    invalidate_scene(resources["scene"])
     
+    # play the music
+    return {"music_length": spooky_music(0.3), "music_clock": core.Clock()}
+
+def update_music_screen(resources, state):
+    # ESC stops the music
+    if 'escape' in get_keys("music_screen", ['escape']):
+        get_music_track(0.3).stop()
+        return go_home()
+    if state["music_clock"].getTime() >= state["music_length"]:
+        return go_home() # exit to main menu
+    return None
+
+def draw_music_screen(resources, state):
+    time_left = state["music_length"] - state["music_clock"].getTime()
+    present_scene(resources["scene"], idle_timeout=max(0.0, min(idle_input_timeout, time_left)))
+
+def exit_music_screen(resources, state):
     # clear the key inputs so it doesnt quit out of the game when music is done
     event.clearEvents()
     # wait a bit so you can process the greatness that just happened
     core.wait(0.50)
-    
-    # exit to main menu
-    return None
+
+register_screen("music_screen", create_music_screen, enter_music_screen, update_music_screen, draw_music_screen, exit_music_screen)
 
 # ==============================================================================
 # pong game
 # ==============================================================================
-def run_pong(ball_speed_x, pong_high_score):
+# the physics live in pong_sim, this screen draws a game and feeds it the paddle input, from
+# the keyboard or from a replay recording
+def create_pong(resources):
     # create text
-    pong_score_text      = visual.TextStim(window, pos=(0, 0.90), height=0.08, color='white')
-    pong_high_score_text = visual.TextStim(window, pos=(0, 0.82), height=0.05, color='white')
-
-    # pong game boolean
-    replay_pong_game = True
+    resources["score_text"]      = visual.TextStim(window, pos=(0, 0.90), height=0.08, color='white')
+    resources["high_score_text"] = visual.TextStim(window, pos=(0, 0.82), height=0.05, color='white')
     
     # pong pumpkin
-    pong_pumpkin = create_pumpkin(0.0, 0.0)
-    
-    # pong ball speed
-    ball_speed_y = ball_speed_x / 2.5
-
-    # create the pong paddle
-    paddle_height = 0.25
-    paddle_width  = 0.03
-    paddle_x_position = -0.95
-    paddle_y_position = +0.00
-    paddle_rectangle = visual.Rect(window, width=paddle_width, height=paddle_height, fillColor='white', lineColor='white')
-    
-    # pong game loop
-    while replay_pong_game:
-        # set start point for pong ball
-        ball_x_position = 0.0
-        ball_y_position = random.uniform(-0.80,0.80) # random starting position so there is no fixed pattern in the game
-        
-        # reset pumpkin & paddle to start position
-        update_pumpkin_position(pong_pumpkin, ball_x_position, ball_y_position)
-        paddle_y_position = 0
-        
-        # start with a score of 0
-        pong_score = 0
-        
-        # pong game boolean
-        pong_game_running = True
-        
-        # pong game loop
-        while pong_game_running:
-            keys_pressed = event.getKeys()
-            if 'up' in keys_pressed: 
-                paddle_y_position += 0.08
-            if 'down' in keys_pressed: 
-                paddle_y_position -= 0.08
-            if 'escape' in keys_pressed: 
-                # clear the window
-                window.clearBuffer()
-                
-                # set the pong high score
-                if pong_score > pong_high_score:
-                    pong_high_score = pong_score
-                    
-                # game over text
-                game_over_text = visual.TextStim(window, text=f"Game Over!\n\nScore: {pong_score}\nHigh Score: {pong_high_score}\n\nPress R to replay or SPACE to return to menu", pos=(0, 0), height=0.07, color='white')
-                game_over_text.draw()
-                window.flip()
-                
-                # game over screen
-                while True:
-                    keys_pressed = event.getKeys(['escape', 'r', 'space'])
-                    if 'r' in keys_pressed:
-                        ball_speed_x = abs(ball_speed_x) # makes sure the ball direction gets reset
-                        pong_game_running = False # restarts the game
-                        window.clearBuffer() # clear the window
-                        break
-                    if 'space' in keys_pressed or 'escape' in keys_pressed or 'return' in keys_pressed: 
-                        return pong_high_score
-
-            # move ball
-            ball_x_position += ball_speed_x
-            ball_y_position += ball_speed_y
-            update_pumpkin_position(pong_pumpkin, ball_x_position, ball_y_position)
-
-            # bounce top/bottom & right wall
-            ball_radius = 0.5 * pumpkin_outer_size * pong_pumpkin.get("scale", 1.0)
-            if ball_y_position + ball_radius > +1.0:
-                ball_speed_y *= -1
-                hit_sound.play()
-            if ball_y_position - ball_radius < -1.0:
-                ball_speed_y *= -1
-                hit_sound.play()
-            if ball_x_position + ball_radius >= 1.0:
-                ball_speed_x *= -1
-                hit_sound.play()
-
-            # paddle collision
-            paddle_top    = paddle_y_position + paddle_height / 2
-            paddle_bottom = paddle_y_position - paddle_height / 2
-            paddle_right  = paddle_x_position + paddle_width  / 2
-            if (ball_x_position - ball_radius <= paddle_right and paddle_bottom < ball_y_position < paddle_top):
-                ball_speed_x *= -1
-                pong_score += 1
-                hit_sound.play()
-
-            # lose condition
-            if ball_x_position - ball_radius <= -1.0:
-                lose_sound_1.play()
-                core.wait(0.45)
-                lose_sound_2.play()
-                core.wait(0.45)
-                lose_sound_3.play()
-                game_over_animation()
-                
-                # set the pong high score
-                if pong_score > pong_high_score:
-                    pong_high_score = pong_score
-                
-                # clear the window
-                window.clearBuffer()
-                
-                # game over text
-                game_over_text = visual.TextStim(window, text=f"Game Over!\n\nScore: {pong_score}\nHigh Score: {pong_high_score}\n\nPress R to replay or SPACE to return to menu", pos=(0, 0), height=0.07, color='white')
-                game_over_text.draw()
-                window.flip()
-                
-                # game over screen
-                while True:
-                    keys_pressed = event.getKeys(['escape', 'r', 'space'])
-                    if 'r' in keys_pressed:
-                        ball_speed_x = abs(ball_speed_x) # makes sure the ball direction gets reset
-                        pong_game_running = False # restarts the game
-                        window.clearBuffer() # clear the window
-                        break
-                    if 'space' in keys_pressed or 'escape' in keys_pressed or 'return' in keys_pressed: 
-                        return pong_high_score
-
-            # draw everything
-            paddle_rectangle.pos = (paddle_x_position, paddle_y_position)
-            paddle_rectangle.draw()
-            
-            pong_score_text.text = f"Score: {pong_score}"
-            pong_high_score_text.text = f"High Score: {pong_high_score}"
-            pong_score_text.draw()
-            pong_high_score_text.draw()
-            
-            draw_pumpkin(pong_pumpkin)
-            
-            window.flip()
-            core.wait(1/240)
+    resources["pumpkin"] = create_pumpkin(0.0, 0.0, sprite=True)
+    
+    # create the pong paddle, it moves for as long as ↑/↓ are held
+    resources["paddle"] = visual.Rect(window, width=pong_sim.paddle_width, height=pong_sim.paddle_height, fillColor='white', lineColor='white')
+    
+    resources["game_over"] = create_game_over_animation()
 
-# ==============================================================================
-# game over animation
-# ==============================================================================
-def game_over_animation():
-    # clear the screen
-    window.clearBuffer()
+def enter_pong(resources, ball_speed_x, replay_recording=None):
+    # scores are saved per difficulty
+    pong_difficulty = pong_sim.difficulty_speeds.index(ball_speed_x)
+    
+    # every game is recorded (seed + paddle input per physics tick) so it can be played back exactly
+    if replay_recording is None:
+        recording = replay.create_recording("pong", replay.new_seed(), (pong_difficulty, int(physics_tick_rate)))
+    else:
+        recording = replay_recording
+    replay_events = iter(recording["events"] if replay_recording is not None else [])
     
-    # create all the visual objects
-    fade_rectangle = visual.Rect(window, width=2, height=2, fillColor='black', lineColor='black', opacity=0.0)
-    game_over_pumpkin = create_pumpkin(0.0, 0.0)
-    game_over_pumpkin_y = 0.00
+    # physics runs at a fixed tick, drawing happens once per refresh. a replay steps at the tick
+    # rate it was recorded with, otherwise the same input would play a different round
+    tick_rate = float(recording["parameters"][1])
+    game_loop = screen_resource(resources, ("game_loop", tick_rate), lambda: create_game_loop(tick_rate))
     
-    # number of steps
-    steps = 80
+    # the ball starts at a random height from the seed, a batch of one pong_sim game
+    pong_game = replay.create_pong_game(recording)
+    ball_position = (float(pong_game["ball_x"][0]), float(pong_game["ball_y"][0]))
     
-    # get the starting scale
-    scale = game_over_pumpkin.get("scale")
+    # reset pumpkin & paddle to start position
+    set_pumpkin_skin(resources["pumpkin"], current_skin) # the skin may have changed in the store
+    warm_pumpkin_sprite(resources["pumpkin"])
+    update_pumpkin_position(resources["pumpkin"], *ball_position)
+    keyboard = get_keyboard_state()
+    release_keys(keyboard)
+    reset_game_loop(game_loop)
     
-    # rumble settings
-    rumble_degrees = 13
-    rumble_speed = steps / 8
+    return {
+        "ball_speed_x": ball_speed_x,
+        "difficulty_name": pong_sim.difficulty_names[pong_difficulty],
+        "replay_recording": replay_recording,
+        "recording": recording,
+        "replay_events": replay_events,
+        "next_replay_event": next(replay_events, None),
+        "replay_ended": False,
+        "round_tick": 0,
+        "game_loop": game_loop,
+        "game": pong_game,
+        "keyboard": keyboard,
+        "paddle_keys_down": {},
+        "paddle_direction": 0,
+        "ball": ball_position,
+        "previous_ball": ball_position,
+        "paddle_y": 0.0,
+        "previous_paddle_y": 0.0,
+        "score": 0, # start with a score of 0
+        "lost": False # True while the game over animation runs
+    }
+
+def update_pong(resources, state):
+    keys_pressed = get_keys("run_pong", ['escape', 'space'])
     
-    for i in range(steps):
-        # set the scale
-        scale *= 1.04
-        game_over_pumpkin["scale"] = scale # update dictionary so positions are correct
-        set_pumpkin_scale(game_over_pumpkin, scale)
+    # the game over animation plays frame by frame, so keys are still read while it runs
+    if state["lost"]:
+        if 'escape' not in keys_pressed and 'space' not in keys_pressed and not animation_finished(resources["game_over"]["animation"]):
+            return None
+        return finish_pong_round(state) # animation over (or skipped) --> game over screen
+    if 'escape' in keys_pressed:
+        return finish_pong_round(state)
+    
+    # physics steps for the time since the last frame, the keys are sampled once per step
+    game_loop = state["game_loop"]
+    pong_game = state["game"]
+    pump_keyboard(state["keyboard"])
+    for step in range(advance_game_loop(game_loop)):
+        state["previous_ball"]     = state["ball"]
+        state["previous_paddle_y"] = state["paddle_y"]
         
-        # reset pumpkin positions based on the new scale
-        game_over_pumpkin_y += 0.00
-        update_pumpkin_position(game_over_pumpkin, 0.0, game_over_pumpkin_y)
+        if state["replay_recording"] is None:
+            keys_down = sample_keys(state["keyboard"], ['up', 'down'])
+            for name, down_time in keys_down.items():
+                if state["paddle_keys_down"].get(name) != down_time:
+                    record_latency("pong", name, down_time) # a new press starts moving the paddle now
+            state["paddle_keys_down"] = keys_down
+            
+            # only changes of direction are recorded
+            if ('up' in keys_down) - ('down' in keys_down) != state["paddle_direction"]:
+                state["paddle_direction"] = ('up' in keys_down) - ('down' in keys_down)
+                replay.record_event(state["recording"], state["round_tick"], replay.event_paddle, [state["paddle_direction"]])
+        else:
+            # the recorded input of this tick, the end event means the player pressed escape here
+            while state["next_replay_event"] is not None and state["next_replay_event"][0] == state["round_tick"]:
+                event_time, kind, payload = state["next_replay_event"]
+                if kind == replay.event_paddle:
+                    state["paddle_direction"] = payload[0]
+                elif kind == replay.event_end:
+                    state["replay_ended"] = True
+                state["next_replay_event"] = next(state["replay_events"], None)
+            if state["replay_ended"]:
+                return finish_pong_round(state)
         
-        # apply rotation to all pumpkin parts
-        rotation = rumble_degrees * math.sin( (2 * math.pi) * i / rumble_speed )
-        set_pumpkin_rotation(game_over_pumpkin, rotation)
+        pong_sim.move_player_paddles(pong_game, state["paddle_direction"], game_loop["tick"])
+        state["paddle_y"] = float(pong_game["paddle_y"][0])
         
-        # fade in black rectangle
-        fade_rectangle.opacity = i / steps
+        pong_events = pong_sim.step_games(pong_game, game_loop["tick"])
+        state["round_tick"] += 1
+        state["ball"] = (float(pong_game["ball_x"][0]), float(pong_game["ball_y"][0]))
         
-        # draw everything
-        draw_pumpkin(game_over_pumpkin)
-        fade_rectangle.draw()
+        if pong_events["wall_hit"][0] or pong_events["paddle_hit"][0]:
+            play_sound_effect("hit")
+        state["score"] = int(pong_game["score"][0])
         
-        # update window at 60 FPS
-        window.flip()
-        core.wait(1/60.0)
+        # lose condition
+        if pong_events["lost"][0]:
+            if state["replay_recording"] is None:
+                replay.record_event(state["recording"], state["round_tick"], replay.event_end, [state["score"]])
+            play_sound_sequence(lose_sound_sequence) # plays on while the animation runs
+            restart_game_over_animation(resources["game_over"])
+            state["lost"] = True
+            break
+    return None
 
-# ==============================================================================
-# squash difficulty menu
-# ==============================================================================
-def squash_difficulty_menu():
-    options = ["Easy  ", "Medium  ", "Hard  "] # 2 spaces as  suffix needed because I add 2 characters as a prefix later on
+def finish_pong_round(state):
+    # saves a played round and goes to the game over screen, R there plays the same difficulty (or replay) again
+    pong_score = state["score"]
+    if state["replay_recording"] is None:
+        if not state["lost"]:
+            replay.record_event(state["recording"], state["round_tick"], replay.event_end, [pong_score])
+        save_round_replay(state["recording"])
+        save_score("pong", pong_score, difficulty=state["difficulty_name"])
+        
+        # set the pong high score
+        if pong_score > session["pong_high_score"]:
+            session["pong_high_score"] = pong_score
+    
+    return ("game_over", {"text": f"Game Over!\n\nScore: {pong_score}\nHigh Score: {session['pong_high_score']}\n\nPress R to replay or SPACE to return to menu",
+                          "replay_screen": ("pong", {"ball_speed_x": state["ball_speed_x"], "replay_recording": state["replay_recording"]})})
+
+def draw_pong(resources, state):
+    if state["lost"]:
+        draw_game_over_animation(resources["game_over"])
+        present_frame("run_pong")
+        return
     
-    difficulty = [0, 1, 2]
+    # draw the ball between the last two physics states so motion stays smooth at any refresh rate
+    alpha = game_loop_alpha(state["game_loop"])
+    (previous_x, previous_y), (x, y) = state["previous_ball"], state["ball"]
+    update_pumpkin_position(resources["pumpkin"], previous_x + (x - previous_x) * alpha, previous_y + (y - previous_y) * alpha)
+
+    # draw everything
+    draw_pumpkin(resources["pumpkin"])
+    
+    paddle_rectangle = resources["paddle"]
+    paddle_rectangle.pos = (pong_sim.paddle_x_position, state["previous_paddle_y"] + (state["paddle_y"] - state["previous_paddle_y"]) * alpha)
+    paddle_rectangle.draw()
     
-    selected_option = 1 # defaults to medium difficulty
+    resources["score_text"].text      = f"Score: {state['score']}"
+    resources["high_score_text"].text = f"High Score: {session['pong_high_score']}"
+    resources["score_text"].draw()
+    resources["high_score_text"].draw()
     
-    title = visual.TextStim(window, text="Select your difficulty:", pos=(0, 0.55), height=0.12, color='orange', bold = True)
-    instructions = visual.TextStim(window, text="Use ↑/↓ to navigate | SPACE to select | ESC to quit", pos=(0, -0.8), height=0.05, color='gray')
+    # flip() waits for vsync, that paces the loop
+    present_frame("run_pong")
 
-    while True:
-        # drawing the normal texts
-        title.draw()
-        instructions.draw()
-        
-        # menu selection
-        menu_option_spacing = 0.12
-        for index, option in enumerate(options):
-            if index == selected_option:
-                prefix = "> "
-            else:
-                prefix = "  "
-            menu_option = visual.TextStim(window, text=f"{prefix}{option}", pos=(0, 0.15 - index*menu_option_spacing), height=0.07, color='white', italic=True)
-            menu_option.draw()
+register_screen("pong", create_pong, enter_pong, update_pong, draw_pong)
 
-        # get key inputs
-        keys_pressed = event.getKeys()
-        if 'up' in keys_pressed:
-            selected_option = (selected_option - 1) % len(options)
-        if 'down' in keys_pressed:
-            selected_option = (selected_option + 1) % len(options)
-        if 'space' in keys_pressed or 'return' in keys_pressed:
-            return difficulty[selected_option]
-        if 'escape' in keys_pressed:
-            return None # exits the difficulty selection --> returns to the start
-        
-        # update the window at 60 FPS
-        window.flip()
-        core.wait(1/60.0)
+# ==============================================================================
+# game over screen
+# ==============================================================================
+# the end of a pong or squash round: the score until R plays again or SPACE goes back
+def create_game_over_screen(resources):
+    # game over text
+    resources["text"] = visual.TextStim(window, text="", pos=(0, 0), height=0.07, color='white')
+    resources["scene"] = create_scene("game_over", [(resources["text"].draw, lambda: resources["text"].text)])
+
+def enter_game_over_screen(resources, text, replay_screen):
+    # clear the window
+    window.clearBuffer()
+    resources["text"].text = text
+    invalidate_scene(resources["scene"])
+    return {"replay_screen": replay_screen}
+
+def update_game_over_screen(resources, state):
+    keys_pressed = get_keys("game_over", ['escape', 'r', 'space'])
+    if 'r' in keys_pressed:
+        window.clearBuffer() # clear the window
+        return state["replay_screen"]
+    if 'space' in keys_pressed or 'escape' in keys_pressed or 'return' in keys_pressed: 
+        return go_home()
+    return None
+
+def draw_game_over_screen(resources, state):
+    # the text is drawn once, then the screen sleeps until a key comes
+    present_scene(resources["scene"])
+
+register_screen("game_over", create_game_over_screen, enter_game_over_screen, update_game_over_screen, draw_game_over_screen)
 
 # ==============================================================================
-# squash time menu
+# pong game over animation
 # ==============================================================================
-def squash_game_time_menu():
-    options = ["10s  ", "20s  ", "30s  "] # 2 spaces as  suffix needed because I add 2 characters as a prefix later on
-    
-    total_game_time = [10, 20, 30]
-    
-    selected_option = 1 # defaults to medium difficulty
+def create_game_over_animation():
+    # everything the animation needs, draw_game_over_animation plays it one frame at a time
+    return {
+        "animation": start_animation("game_over"),
+        "pumpkin": create_pumpkin(0.0, 0.0),
+        "fade_rectangle": visual.Rect(window, width=2, height=2, fillColor='black', lineColor='black', opacity=0.0)
+    }
+
+def restart_game_over_animation(game_over):
+    # plays the animation again from the start, with the skin equipped now
+    game_over["animation"] = start_animation("game_over")
+    set_pumpkin_skin(game_over["pumpkin"], current_skin)
+
+def draw_game_over_animation(game_over):
+    # draws the current frame, returns False once the animation is over
+    if animation_finished(game_over["animation"]):
+        return False
+    values = animation_values(game_over["animation"])
+    animate_pumpkin(game_over["pumpkin"], values, 0.0, 0.0)
+    game_over["fade_rectangle"].opacity = values["opacity"]
     
-    title = visual.TextStim(window, text="Select your difficulty:", pos=(0, 0.55), height=0.12, color='orange', bold = True)
-    instructions = visual.TextStim(window, text="Use ↑/↓ to navigate | SPACE to select | ESC to quit", pos=(0, -0.8), height=0.05, color='gray')
+    draw_pumpkin(game_over["pumpkin"])
+    game_over["fade_rectangle"].draw()
+    return True
 
-    while True:
-        # drawing the normal texts
-        title.draw()
-        instructions.draw()
-        
-        # menu selection
-        menu_option_spacing = 0.12
-        for index, option in enumerate(options):
-            if index == selected_option:
-                prefix = "> "
-            else:
-                prefix = "  "
-            menu_option = visual.TextStim(window, text=f"{prefix}{option}", pos=(0, 0.15 - index*menu_option_spacing), height=0.07, color='white', italic=True)
-            menu_option.draw()
+# ==============================================================================
+# squash difficulty menu
+# ==============================================================================
+register_menu_screen("squash_difficulty_menu", ["Easy  ", "Medium  ", "Hard  "], # 2 spaces as  suffix needed because I add 2 characters as a prefix later on
+                     selected_option=1, # defaults to medium difficulty
+                     title="Select your difficulty:",
+                     choose=lambda option, state: ("squash_game_time_menu", {"difficulty": option}))
 
-        # get key inputs
-        keys_pressed = event.getKeys()
-        if 'up' in keys_pressed:
-            selected_option = (selected_option - 1) % len(options)
-        if 'down' in keys_pressed:
-            selected_option = (selected_option + 1) % len(options)
-        if 'space' in keys_pressed or 'return' in keys_pressed:
-            return total_game_time[selected_option]
-        if 'escape' in keys_pressed:
-            return None # exits the difficulty selection --> returns to the start
-        
-        # update the window at 60 FPS
-        window.flip()
-        core.wait(1/60.0)
+# ==============================================================================
+# squash time menu
+# ==============================================================================
+squash_game_times = [10, 20, 30] # seconds
 
+register_menu_screen("squash_game_time_menu", ["10s  ", "20s  ", "30s  "], # 2 spaces as  suffix needed because I add 2 characters as a prefix later on
+                     selected_option=1, # defaults to 20s
+                     title="Select your difficulty:",
+                     choose=lambda option, state: ("squash", {"difficulty": state["difficulty"], "total_game_time": squash_game_times[option]}))
 
 # ==============================================================================
 # squash squash
 # ==============================================================================
-def squash_squash_game(squash_difficulty, total_game_time, squash_high_score):
-    # define variables
-    squash_score = 0
-    if squash_difficulty == 0:
-        grid_rows          = 3
-        grid_columns       = 3
-        cell_spacing       = 0.40
-        pumpkin_spawn_time = 1.50
-    elif squash_difficulty == 1:
-        grid_rows          = 4
-        grid_columns       = 4
-        cell_spacing       = 0.35
-        pumpkin_spawn_time = 1.00
-    elif squash_difficulty == 2:
-        grid_rows          = 4
-        grid_columns       = 5
-        cell_spacing       = 0.30
-        pumpkin_spawn_time = 0.60
-        
-    squash_score_text      = visual.TextStim(window, pos=(0, 0.90), height=0.08, color='white')
-    squash_high_score_text = visual.TextStim(window, pos=(0, 0.82), height=0.05, color='white')
-    time_display           = visual.TextStim(window, pos=(-0.30, 0.86), height=0.08, color='orange')
-
-    # calculate grid start position
-    start_x = -( (grid_columns - 1) * cell_spacing ) / 2
-    start_y = +( (grid_rows    - 1) * cell_spacing ) / 2
+# the rules (grid, spawns, hits) live in squash_sim, this screen draws a round and feeds it
+# clicks, from the mouse or from a replay recording
+def create_squash(resources):
+    resources["score_text"]      = visual.TextStim(window, pos=(0, 0.90), height=0.08, color='white')
+    resources["high_score_text"] = visual.TextStim(window, pos=(0, 0.82), height=0.05, color='white')
+    resources["time_display"]    = visual.TextStim(window, pos=(-0.30, 0.86), height=0.08, color='orange')
+    resources["mouse"]           = event.Mouse()
+
+def create_squash_grid(squash_difficulty):
+    # the pumpkins and grid lines of one difficulty
+    grid_index   = squash_sim.create_difficulty_grid(squash_difficulty)
+    grid_rows    = grid_index["rows"]
+    grid_columns = grid_index["columns"]
+    cell_spacing = grid_index["cell_spacing"]
+    start_x      = grid_index["start_x"]
+    start_y      = grid_index["start_y"]
 
     # create pumpkins for each cell
     grid_pumpkins = []
@@ -791,139 +1896,250 @@ def squash_squash_game(squash_difficulty, total_game_time, squash_high_score):
         for column in range(grid_columns):
             x = start_x + column * cell_spacing
             y = start_y - row    * cell_spacing
-            pumpkin = create_pumpkin(x, y)
+            pumpkin = create_pumpkin(x, y, sprite=True)
             update_pumpkin_position(pumpkin, x, y)
             grid_pumpkins.append(pumpkin)
 
     # create visible grid lines
-    grid_lines  = []
-    grid_width  = (grid_columns - 1) * cell_spacing
-    grid_height = (grid_rows -    1) * cell_spacing
-
-    # vertical lines
-    for i in range(grid_columns + 1):
-        x = start_x - (cell_spacing / 2) + i * cell_spacing
-        line = visual.Line(window, start=(x, start_y + (cell_spacing / 2)), end=(x, start_y - grid_height - (cell_spacing / 2)), lineColor='gray', lineWidth=2)
-        grid_lines.append(line)
-
-    # horizontal lines
-    for j in range(grid_rows + 1):
-        y = start_y + (cell_spacing / 2) - j * cell_spacing
-        line = visual.Line(window, start=(start_x - (cell_spacing / 2), y), end=(start_x + grid_width + (cell_spacing / 2), y), lineColor='gray', lineWidth=2)
-        grid_lines.append(line)
-    
-    replay_squash_game = True
-    while replay_squash_game:
-        # game timing setup
-        game_clock = core.Clock()
-        active_pumpkin = None
-        next_spawn_time = 0
-        mouse = event.Mouse()
-
-        # reset score each round
-        squash_score = 0
-
-        # main game loop
-        while game_clock.getTime() < total_game_time:
-            current_time = game_clock.getTime()
-            time_left = max(0, int(total_game_time - current_time))
-
-            # choose a pumpkin to activate
-            if active_pumpkin is None or current_time >= next_spawn_time:
-                active_pumpkin = random.choice(grid_pumpkins)
-                next_spawn_time = current_time + pumpkin_spawn_time
-
-            # clear and draw grid
-            window.clearBuffer()
-            for line in grid_lines:
-                line.draw()
-
-            # draw only the active pumpkin
-            for pumpkin in grid_pumpkins:
-                if pumpkin == active_pumpkin:
-                    draw_pumpkin(pumpkin)
-
-            # draw text
-            squash_score_text       .text = f"Score: {squash_score}"
-            squash_high_score_text  .text = f"High Score: {squash_high_score}"
-            time_display            .text = f"Time Left: {time_left}s"
-            
-            squash_score_text.draw()
-            squash_high_score_text.draw()
-            time_display.draw()
-
-            window.flip()
-
-            # handle mouse click
-            if mouse.getPressed()[0]:
-                if active_pumpkin is not None:
-                    mouse_x, mouse_y = mouse.getPos()
-                    pumpkin_x = active_pumpkin["pumpkin_x_position"]
-                    pumpkin_y = active_pumpkin["pumpkin_y_position"]
-                    if abs(mouse_x - pumpkin_x) < 0.1 and abs(mouse_y - pumpkin_y) < 0.1:
-                        squash_score += 1
-                        active_pumpkin = None
-                        hit_sound.play()
-                        core.wait(0.15)  # debounce time
-
-            # exit with escape key
-            keys_pressed = event.getKeys()
-            if 'escape' in keys_pressed:
-                break
-
-            core.wait(1/60.0)
+    def create_grid_lines():
+        grid_lines  = []
+        grid_width  = (grid_columns - 1) * cell_spacing
+        grid_height = (grid_rows -    1) * cell_spacing
+
+        # vertical lines
+        for i in range(grid_columns + 1):
+            x = start_x - (cell_spacing / 2) + i * cell_spacing
+            line = visual.Line(window, start=(x, start_y + (cell_spacing / 2)), end=(x, start_y - grid_height - (cell_spacing / 2)), lineColor='gray', lineWidth=2)
+            grid_lines.append(line)
+
+        # horizontal lines
+        for j in range(grid_rows + 1):
+            y = start_y + (cell_spacing / 2) - j * cell_spacing
+            line = visual.Line(window, start=(start_x - (cell_spacing / 2), y), end=(start_x + grid_width + (cell_spacing / 2), y), lineColor='gray', lineWidth=2)
+            grid_lines.append(line)
+        return grid_lines
+
+    # the grid never changes during a round, so it's drawn from a background layer
+    return {"pumpkins": grid_pumpkins, "background": get_background_layer(f"squash_grid_{squash_difficulty}", create_grid_lines)}
+
+def enter_squash(resources, difficulty, total_game_time, replay_recording=None):
+    grid = screen_resource(resources, ("grid", difficulty), lambda: create_squash_grid(difficulty))
+    for pumpkin in grid["pumpkins"]:
+        set_pumpkin_skin(pumpkin, current_skin) # the skin may have changed in the store
+    warm_pumpkin_sprite(grid["pumpkins"][0]) # all grid pumpkins share the equipped skin
+    
+    # every round is recorded (seed + clicks) so it can be played back exactly
+    if replay_recording is None:
+        recording = replay.create_recording("squash", replay.new_seed(), (difficulty, total_game_time))
+    else:
+        recording = replay_recording
+    replay_events = iter(recording["events"] if replay_recording is not None else [])
+    
+    # game timing setup
+    return {
+        "difficulty": difficulty,
+        "total_game_time": total_game_time,
+        "replay_recording": replay_recording,
+        "recording": recording,
+        "replay_events": replay_events,
+        "next_replay_event": next(replay_events, None),
+        "round": squash_sim.create_round(difficulty, total_game_time, recording["seed"]),
+        "grid": grid,
+        "game_clock": core.Clock(),
+        "round_time": 0,
+        "time_left": total_game_time,
+        "mouse_was_pressed": False,
+        "keyboard": get_keyboard_state(), # for the time the mouse button went down
+        "round_ended": False # a replay ends at its end event
+    }
+
+def update_squash(resources, state):
+    squash_round = state["round"]
+    
+    # exit with escape key, the round also ends with the timer or a replay's end event
+    keys_pressed = get_keys("squash_squash_game")
+    if 'escape' in keys_pressed or state["round_ended"]:
+        return finish_squash_round(state)
+    current_time = state["game_clock"].getTime()
+    round_time = state["round_time"] = squash_sim.quantize_time(current_time)
+    state["time_left"] = max(0, int(state["total_game_time"] - current_time))
+    if squash_sim.round_over(squash_round, round_time):
+        return finish_squash_round(state)
+
+    # handle clicks before drawing, so a squash shows up in the very next frame
+    clicks = []
+    if state["replay_recording"] is None:
+        # (only the moment the button goes down counts, holding it doesn't squash again)
+        pump_keyboard(state["keyboard"])
+        mouse = resources["mouse"]
+        mouse_pressed = mouse.getPressed()[0]
+        if mouse_pressed and not state["mouse_was_pressed"]:
+            click = squash_sim.quantize_position(*mouse.getPos())
+            replay.record_event(state["recording"], round_time, replay.event_click, click)
+            clicks.append((round_time, click))
+        state["mouse_was_pressed"] = mouse_pressed
+    else:
+        while state["next_replay_event"] is not None and state["next_replay_event"][0] <= round_time:
+            event_time, kind, payload = state["next_replay_event"]
+            if kind == replay.event_click:
+                clicks.append((event_time, payload))
+            elif kind == replay.event_end:
+                state["round_ended"] = True
+            state["next_replay_event"] = next(state["replay_events"], None)
+    
+    for click_time, (click_x, click_y) in clicks:
+        if squash_sim.click(squash_round, click_time, click_x, click_y):
+            play_sound_effect("hit")
+            record_latency("squash", "mouse", state["keyboard"]["down"].get("mouse", core.getTime()))
+
+    # the pumpkin that is up right now
+    squash_sim.advance_round(squash_round, round_time)
+    return None
+
+def finish_squash_round(state):
+    # saves a played round and goes to the game over screen, R there plays the same settings (or replay) again
+    squash_score = state["round"]["score"]
+    
+    # the end event carries the score so playback can check it
+    if state["replay_recording"] is None:
+        replay.record_event(state["recording"], min(state["round_time"], state["round"]["end_time"]), replay.event_end, [squash_score])
+        save_round_replay(state["recording"])
 
         # end of timer
-        if squash_score > squash_high_score:
-            squash_high_score = squash_score
+        save_score("squash", squash_score, difficulty=squash_sim.difficulty_names[state["difficulty"]], time_limit=state["total_game_time"])
+        if squash_score > session["squash_high_score"]:
+            session["squash_high_score"] = squash_score
+    
+    return ("game_over", {"text": f"Time's up!\n\nScore: {squash_score}\nHigh Score: {session['squash_high_score']}\n\nPress R to replay or SPACE to return to menu",
+                          "replay_screen": ("squash", {"difficulty": state["difficulty"], "total_game_time": state["total_game_time"],
+                                                "replay_recording": state["replay_recording"]})})
 
-        # clear the window
-        window.clearBuffer()
-        
-        # game over text
-        game_over_text = visual.TextStim(window, text=f"Time's up!\n\nScore: {squash_score}\nHigh Score: {squash_high_score}\n\nPress R to replay or SPACE to return to menu", pos=(0, 0), height=0.07, color='white')
-        game_over_text.draw()
-        window.flip()
-        
-        # game over screen (rewritten like Pong)
-        while True:
-            keys_pressed = event.getKeys(['up', 'down', 'escape', 'r', 'space'])
-            if 'r' in keys_pressed:
-                replay_squash_game = True  # restarts the game
-                window.clearBuffer()       # clear the window
-                break
-            if 'space' in keys_pressed or 'escape' in keys_pressed or 'return' in keys_pressed: 
-                return squash_high_score
+def draw_squash(resources, state):
+    # draw the grid (this also replaces clearing the window)
+    state["grid"]["background"].draw()
+
+    # draw only the active pumpkin
+    draw_pumpkin(state["grid"]["pumpkins"][state["round"]["active_cell"]])
+
+    # draw text
+    resources["score_text"]      .text = f"Score: {state['round']['score']}"
+    resources["high_score_text"] .text = f"High Score: {session['squash_high_score']}"
+    resources["time_display"]    .text = f"Time Left: {state['time_left']}s"
+    
+    resources["score_text"].draw()
+    resources["high_score_text"].draw()
+    resources["time_display"].draw()
+
+    present_frame("squash_squash_game")
+
+register_screen("squash", create_squash, enter_squash, update_squash, draw_squash)
+
+# ==============================================================================
+# scores
+# ==============================================================================
+score_store = None # opened in main(), tools that draw screens without it just don't save scores
+replay_writer = None # opened in main() too, so tools playing rounds don't fill the replay directory
+
+def save_score(game, score, difficulty="", time_limit=0):
+    # queued, the score store writes it from its own thread
+    if score_store is not None:
+        scores.record_score(score_store, game, score, difficulty, time_limit)
 
-            core.wait(1/60.0)
+def save_round_replay(recording):
+    # queued as well, the replay writer saves it from its own thread
+    if replay_writer is not None:
+        replay.queue_replay(replay_writer, recording)
+
+# ==============================================================================
+# startup
+# ==============================================================================
+# the first menu goes on screen as soon as the window is open, everything else warms up after:
+# audio and numpy tables on a background thread, anything that needs the GL context one small
+# job per frame on the main thread, right after the flip
+startup = {
+    "pending": False,      # True until the first frame is reported and the main thread jobs are done
+    "main_start": None,
+    "window_opened": None,
+    "first_frame": None,
+    "main_thread_jobs": collections.deque()
+}
+
+def warm_up_in_background():
+    for name in sound_effects:
+        get_sound_effect(name) # the first one also starts the audio backend
+    get_music_track(0.3)
+    for eye_edges in eye_skin_edges.values():
+        polygon_mask(eye_edges)
+        pumpkin_local_geometry(eye_edges)
+    for name in animations:
+        animation_tables(name)
+
+def start_warm_up():
+    threading.Thread(target=warm_up_in_background, name="warm up", daemon=True).start()
+    
+    startup["main_thread_jobs"].extend([
+        measure_refresh_rate, # the menu is drawn again on the next frame, present_scene redraws while startup is pending
+        get_keyboard_state,
+        lambda: get_screen_resources("pong_difficulty_menu"), # text layout and background layers of the next menus
+        lambda: get_screen_resources("squash_difficulty_menu"),
+        lambda: get_screen_resources("squash_game_time_menu"),
+        lambda: warm_pumpkin_sprite(create_pumpkin(0.0, 0.0, sprite=True)),
+        lambda: request_skin_thumbnails(store_neighbor_skins(parts_order[0], 0)), # the store's first view
+        lambda: draw_pumpkin_batch([create_pumpkin(0.0, 0.0)] * 20), # the music screen's shaders, overdrawn by the next frame
+    ])
+    startup["pending"] = True
+
+def run_startup_step():
+    # called after every flip while startup is pending
+    if startup["first_frame"] is None:
+        startup["first_frame"] = time.perf_counter()
+        print(f"first frame {(startup['first_frame'] - process_start_time) * 1000:.0f} ms after start "
+              f"(imports {(startup['main_start'] - process_start_time) * 1000:.0f} ms, "
+              f"window {(startup['window_opened'] - startup['main_start']) * 1000:.0f} ms, "
+              f"first menu frame {(startup['first_frame'] - startup['window_opened']) * 1000:.0f} ms)")
+        return
+    if startup["main_thread_jobs"]:
+        startup["main_thread_jobs"].popleft()()
+    else:
+        startup["pending"] = False
 
 # ==============================================================================
 # main game loop
 # ==============================================================================
-pong_high_score = 0
-squash_high_score = 0
-
-while True:
-    menu_choice = start_menu() # returns 0 (pong) or 1 (music) or 2 (squash)
-    
-    # pong
-    if menu_choice == 0:
-        pong_difficulty = pong_difficulty_menu()
-        if pong_difficulty != None:
-            pong_high_score = run_pong(pong_difficulty, pong_high_score)
-
-    # music
-    elif menu_choice == 1:
-        music_screen()
-
-    # squash
-    elif menu_choice == 2:
-        squash_difficulty = squash_difficulty_menu()
-        if squash_difficulty != None:
-            total_game_time = squash_game_time_menu()
-            if total_game_time != None:
-                squash_high_score = squash_squash_game(squash_difficulty, total_game_time, squash_high_score)
-    
-    # skin store
-    elif menu_choice == 3:
-        skin_store(pong_high_score,squash_high_score)
+def main():
+    global score_store, replay_writer
+    startup["main_start"] = time.perf_counter()
+    open_window()
+    startup["window_opened"] = time.perf_counter()
+    if profiler_recording:
+        start_profiler()
+        atexit.register(save_profiler_trace)
+    start_warm_up()
+    
+    # high scores of every earlier session, the store only gets written from here on
+    score_store = scores.open_score_store()
+    atexit.register(scores.close_score_store, score_store)
+    session["pong_high_score"]   = scores.high_score(score_store, "pong")
+    session["squash_high_score"] = scores.high_score(score_store, "squash")
+    
+    # python pumpkin.py --replay replays/<file>.pkr plays a recorded round on screen
+    if "--replay" in sys.argv:
+        recording = replay.load_replay(sys.argv[sys.argv.index("--replay") + 1])
+        session["home"] = None # SPACE on the game over screen ends the replay
+        if recording["game"] == "pong":
+            difficulty = recording["parameters"][0] # enter_pong takes the tick rate from the recording
+            run_screens("pong", ball_speed_x=pong_sim.difficulty_speeds[difficulty], replay_recording=recording)
+        else:
+            difficulty, total_game_time = recording["parameters"]
+            run_screens("squash", difficulty=difficulty, total_game_time=total_game_time, replay_recording=recording)
+    else:
+        replay_writer = replay.open_replay_writer()
+        atexit.register(replay.close_replay_writer, replay_writer)
+        
+        # every screen returns the next one, ESC in the start menu ends the game
+        run_screens("start_menu")
+    window.close()
+    core.quit()
+
+if __name__ == "__main__":
+    main()
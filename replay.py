@@ -0,0 +1,244 @@
+# ==============================================================================
+# replays
+# ==============================================================================
+# every pong and squash round is recorded as its RNG seed plus the inputs that changed the
+# game, in a small binary file. played back through pong_sim / squash_sim a round comes out
+# exactly the same, on screen (python pumpkin.py --replay FILE) or headless:
+#
+#   python replay.py replays/*.pkr --repeat 100
+#
+# plays every file headless, checks the final score is still the recorded one and prints how
+# much faster than real time it ran. exits with 1 if any score changed
+import argparse
+import glob
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+import pong_sim
+import squash_sim
+
+replay_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays") # next to the game, wherever it's started from
+replays_kept     = 200 # oldest files are deleted beyond this
+
+# file layout (little endian):
+#   header  "PKRP", version u8, game u8, seed u64, two u16 game parameters
+#             pong:   difficulty index, physics ticks per second
+#             squash: difficulty index, time limit in seconds
+#   events  time delta varint, kind u8, payload
+#             pong times are physics ticks, squash times are milliseconds
+magic   = b"PKRP"
+version = 1
+header_format = struct.Struct("<4sBBQHH")
+
+game_codes = {"pong": 0, "squash": 1}
+game_names = {code: name for name, code in game_codes.items()}
+
+event_paddle = 1 # payload i8: paddle direction from now on
+event_click  = 2 # payload 2 x i16: quantized click position
+event_end    = 3 # payload varint: final score, for checking playback
+
+# ==============================================================================
+# recording
+# ==============================================================================
+def create_recording(game, seed, parameters):
+    return {"game": game, "seed": seed, "parameters": tuple(parameters), "events": []}
+
+def record_event(recording, time, kind, payload=()):
+    recording["events"].append((time, kind, tuple(payload)))
+
+def new_seed():
+    return int.from_bytes(os.urandom(8), "little")
+
+# ==============================================================================
+# encoding
+# ==============================================================================
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def encode(recording):
+    buffer = bytearray(header_format.pack(magic, version, game_codes[recording["game"]], recording["seed"], *recording["parameters"]))
+    last_time = 0
+    for time, kind, payload in recording["events"]:
+        write_varint(buffer, time - last_time)
+        last_time = time
+        buffer.append(kind)
+        if kind == event_paddle:
+            buffer += struct.pack("<b", *payload)
+        elif kind == event_click:
+            buffer += struct.pack("<hh", *payload)
+        elif kind == event_end:
+            write_varint(buffer, payload[0])
+    return bytes(buffer)
+
+def decode(data):
+    file_magic, file_version, game_code, seed, parameter_1, parameter_2 = header_format.unpack_from(data)
+    if file_magic != magic or file_version != version:
+        raise ValueError("not a pumpkin game replay (or one from a newer version)")
+    recording = create_recording(game_names[game_code], seed, (parameter_1, parameter_2))
+
+    offset = header_format.size
+    time = 0
+    while offset < len(data):
+        delta, offset = read_varint(data, offset)
+        time += delta
+        kind = data[offset]
+        offset += 1
+        if kind == event_paddle:
+            payload = struct.unpack_from("<b", data, offset)
+            offset += 1
+        elif kind == event_click:
+            payload = struct.unpack_from("<hh", data, offset)
+            offset += 4
+        elif kind == event_end:
+            score, offset = read_varint(data, offset)
+            payload = (score,)
+        record_event(recording, time, kind, payload)
+    return recording
+
+def save_replay(recording, saved_at=None):
+    # replays/<game>_<date>_<time>_<seed>.pkr, returns the path
+    os.makedirs(replay_directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(saved_at))
+    path = os.path.join(replay_directory, f"{recording['game']}_{stamp}_{recording['seed']:016x}.pkr")
+    with open(path, "wb") as replay_file:
+        replay_file.write(encode(recording))
+
+    # only the newest replays are kept
+    replays = sorted(glob.glob(os.path.join(replay_directory, "*.pkr")), key=os.path.getmtime)
+    for old_replay in replays[:-replays_kept]:
+        os.remove(old_replay)
+    return path
+
+# the game queues its replays, a background thread writes them and prunes the old ones, so a
+# game over screen never waits on the disk (same as the score store)
+def open_replay_writer():
+    writer = {"saves": queue.Queue(), "thread": None}
+    writer["thread"] = threading.Thread(target=run_replay_writer, args=(writer,), name="replay writer", daemon=True)
+    writer["thread"].start()
+    return writer
+
+def close_replay_writer(writer):
+    # waits until everything queued is on disk
+    writer["saves"].put(None)
+    writer["thread"].join()
+
+def queue_replay(writer, recording):
+    # the recording isn't changed after its round, so the writer can encode it later
+    writer["saves"].put((recording, time.time()))
+
+def run_replay_writer(writer):
+    while True:
+        save = writer["saves"].get()
+        if save is None:
+            break
+        try:
+            save_replay(*save)
+        except OSError:
+            pass # full disk or read only install, the round just isn't kept
+
+def load_replay(path):
+    with open(path, "rb") as replay_file:
+        return decode(replay_file.read())
+
+def recorded_score(recording):
+    for time, kind, payload in reversed(recording["events"]):
+        if kind == event_end:
+            return payload[0]
+    return None
+
+# ==============================================================================
+# headless playback
+# ==============================================================================
+def create_pong_game(recording):
+    # the same game run_pong starts for this recording
+    difficulty, tick_rate = recording["parameters"]
+    return pong_sim.create_games(1, pong_sim.difficulty_speeds[difficulty], rng=np.random.default_rng(recording["seed"]))
+
+def play_pong(recording):
+    # {"score", "seconds"}: the final score and how long the round took in game time
+    difficulty, tick_rate = recording["parameters"]
+    dt = 1.0 / tick_rate
+    game = create_pong_game(recording)
+    events = recording["events"]
+    event_index = 0
+    direction = 0
+    tick = 0
+    while True:
+        # inputs recorded at this tick apply before it is stepped, like in run_pong
+        while event_index < len(events) and events[event_index][0] == tick:
+            event_time, kind, payload = events[event_index]
+            event_index += 1
+            if kind == event_paddle:
+                direction = payload[0]
+            elif kind == event_end:
+                return {"score": int(game["score"][0]), "seconds": tick * dt}
+
+        pong_sim.move_player_paddles(game, direction, dt)
+        pong_sim.step_games(game, dt)
+        tick += 1
+        if game["lost"][0]:
+            return {"score": int(game["score"][0]), "seconds": tick * dt}
+
+def create_squash_round(recording):
+    difficulty, total_game_time = recording["parameters"]
+    return squash_sim.create_round(difficulty, total_game_time, recording["seed"])
+
+def play_squash(recording):
+    squash_round = create_squash_round(recording)
+    end_time = squash_round["end_time"]
+    for event_time, kind, payload in recording["events"]:
+        if kind == event_click:
+            squash_sim.click(squash_round, event_time, *payload)
+        elif kind == event_end:
+            end_time = event_time
+            break
+    return {"score": squash_round["score"], "seconds": end_time / squash_sim.time_resolution}
+
+def play(recording):
+    if recording["game"] == "pong":
+        return play_pong(recording)
+    return play_squash(recording)
+
+# ==============================================================================
+# command line
+# ==============================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="play recorded rounds headless and check they still end with the recorded score")
+    parser.add_argument("replays", nargs="*", help="replay files, defaults to everything in replays/ next to the game")
+    parser.add_argument("--repeat", type=int, default=1, help="plays of every replay, for timing")
+    arguments = parser.parse_args()
+
+    paths = arguments.replays or sorted(glob.glob(os.path.join(replay_directory, "*.pkr")))
+    changed = 0
+    for path in paths:
+        recording = load_replay(path)
+        start_time = time.perf_counter()
+        for i in range(arguments.repeat):
+            result = play(recording)
+        elapsed = (time.perf_counter() - start_time) / arguments.repeat
+
+        expected = recorded_score(recording)
+        status = "ok" if expected is None or result["score"] == expected else f"CHANGED (recorded {expected})"
+        changed += status != "ok"
+        print(f"{os.path.basename(path)}: {recording['game']} score {result['score']} {status} | "
+              f"{result['seconds']:.1f}s of play in {elapsed * 1000:.2f} ms ({result['seconds'] / max(elapsed, 1e-9):,.0f}x real time)")
+    raise SystemExit(1 if changed else 0)
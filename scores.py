@@ -0,0 +1,124 @@
+# ==============================================================================
+# score store
+# ==============================================================================
+# every finished round is kept in a SQLite database. the game only queues its scores, a
+# background thread writes them in batches, so a game over screen never waits on the disk.
+# reads use their own connection, WAL mode lets them run while the writer is busy
+import functools
+import getpass
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+default_score_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scores.sqlite3") # next to the game, wherever it's started from
+write_batch_size   = 64   # scores per transaction at most
+write_batch_wait   = 0.25 # seconds the writer waits for more scores before committing a batch
+
+schema = [
+    """CREATE TABLE IF NOT EXISTS scores (
+        id          INTEGER PRIMARY KEY,
+        game        TEXT    NOT NULL,
+        difficulty  TEXT    NOT NULL, -- '' for games without difficulties
+        time_limit  INTEGER NOT NULL, -- seconds, 0 for games without a time limit
+        player      TEXT    NOT NULL,
+        score       INTEGER NOT NULL,
+        played_at   REAL    NOT NULL
+    )""",
+    # top-N per game mode, best overall per game and per-player history stay index lookups
+    "CREATE INDEX IF NOT EXISTS scores_by_mode   ON scores (game, difficulty, time_limit, score DESC)",
+    "CREATE INDEX IF NOT EXISTS scores_by_game   ON scores (game, score DESC)",
+    "CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, game, played_at DESC)"
+]
+
+@functools.lru_cache(maxsize=None)
+def default_player():
+    return os.environ.get("PUMPKIN_PLAYER") or getpass.getuser()
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL") # WAL keeps the database consistent, a crash can only lose the last batch
+    return connection
+
+# ==============================================================================
+# open & close
+# ==============================================================================
+def open_score_store(path=default_score_path):
+    connection = connect(path)
+    with connection:
+        for statement in schema:
+            connection.execute(statement)
+
+    store = {
+        "path": path,
+        "connection": connection, # reads, only from the thread that opened the store
+        "writes": queue.Queue(),
+        "writer": None
+    }
+    store["writer"] = threading.Thread(target=run_score_writer, args=(store,), name="score writer", daemon=True)
+    store["writer"].start()
+    return store
+
+def close_score_store(store):
+    # waits until everything queued is on disk
+    store["writes"].put(None)
+    store["writer"].join()
+    store["connection"].close()
+
+# ==============================================================================
+# writing
+# ==============================================================================
+def record_score(store, game, score, difficulty="", time_limit=0, player=None):
+    # queues the score and returns right away
+    store["writes"].put((game, difficulty or "", int(time_limit or 0), player or default_player(), int(score), time.time()))
+
+def run_score_writer(store):
+    connection = connect(store["path"])
+    writes = store["writes"]
+    running = True
+    while running:
+        batch = [writes.get()]
+
+        # whatever else arrives shortly after goes into the same transaction
+        deadline = time.monotonic() + write_batch_wait
+        while len(batch) < write_batch_size:
+            try:
+                batch.append(writes.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+
+        if None in batch:
+            running = False
+            batch = [row for row in batch if row is not None]
+        if batch:
+            with connection:
+                connection.executemany("INSERT INTO scores (game, difficulty, time_limit, player, score, played_at) VALUES (?, ?, ?, ?, ?, ?)", batch)
+    connection.close()
+
+# ==============================================================================
+# reading
+# ==============================================================================
+# scores still waiting in the write queue don't show up here, the game keeps its session's
+# high scores in memory and only loads them from the store at startup
+def high_score(store, game, difficulty=None, time_limit=None):
+    # best score of a game, of one difficulty or time limit of it if given
+    if difficulty is None and time_limit is None:
+        row = store["connection"].execute("SELECT MAX(score) FROM scores WHERE game = ?", (game,)).fetchone()
+    else:
+        row = store["connection"].execute("SELECT MAX(score) FROM scores WHERE game = ? AND difficulty = ? AND time_limit = ?",
+                                          (game, difficulty or "", int(time_limit or 0))).fetchone()
+    return row[0] or 0
+
+def top_scores(store, game, difficulty="", time_limit=0, limit=10):
+    # [(player, score, played_at)] best first
+    return store["connection"].execute(
+        "SELECT player, score, played_at FROM scores WHERE game = ? AND difficulty = ? AND time_limit = ? ORDER BY score DESC LIMIT ?",
+        (game, difficulty or "", int(time_limit or 0), limit)).fetchall()
+
+def player_scores(store, player, game, limit=10):
+    # [(difficulty, time_limit, score, played_at)] newest first
+    return store["connection"].execute(
+        "SELECT difficulty, time_limit, score, played_at FROM scores WHERE player = ? AND game = ? ORDER BY played_at DESC LIMIT ?",
+        (player, game, limit)).fetchall()
@@ -0,0 +1,90 @@
+# ==============================================================================
+# skin assets
+# ==============================================================================
+# every skin is defined once in skins.json: its name, colors per pumpkin part, unlock score and
+# (for eyes) the eye shape. load_skins() compiles that into psychopy rgb floats (-1..1) and
+# plain lookup tables, and keeps the result in skins.cache.json next to it. the cache is only
+# rebuilt when skins.json changes, so a normal start never parses a color string
+import hashlib
+import json
+import os
+
+compiler_version = 1 # bump when the compiled layout changes, old caches are rebuilt then
+
+asset_directory   = os.path.dirname(os.path.abspath(__file__))
+default_skin_path = os.path.join(asset_directory, "skins.json")
+
+def cache_path_for(source_path):
+    return os.path.splitext(source_path)[0] + ".cache.json"
+
+# ==============================================================================
+# compiling
+# ==============================================================================
+def resolve_color(value):
+    # only needed when the cache is rebuilt, so psychopy's color parser is imported here
+    from psychopy import colors
+    return [round(float(channel), 6) for channel in colors.Color(value).rgb]
+
+def compile_skins(source, source_hash):
+    part_order = list(source["parts"])
+    compiled = {
+        "compiler_version": compiler_version,
+        "source_hash": source_hash,
+        "part_order": part_order,       # order of the skin keys, (body, eyes, mouth, stem)
+        "skin_names": {},               # part --> skin names in store order
+        "unlock_scores": {},            # part --> skin name --> pong high score needed
+        "eye_edges": {},                # eye skin name --> edges of the eye shape
+        "colors": {},                   # part --> skin name --> pumpkin part --> rgb
+        "part_categories": {},          # pumpkin part --> the skin part it takes its color from
+        "fixed_colors": {pumpkin_part: resolve_color(value) for pumpkin_part, value in source.get("fixed_colors", {}).items()}
+    }
+
+    for part, part_skins in source["parts"].items():
+        compiled["skin_names"][part]    = [skin["name"] for skin in part_skins]
+        compiled["unlock_scores"][part] = {skin["name"]: int(skin["unlock_score"]) for skin in part_skins}
+        compiled["colors"][part]        = {skin["name"]: {pumpkin_part: resolve_color(value) for pumpkin_part, value in skin["colors"].items()}
+                                           for skin in part_skins}
+        if len(compiled["colors"][part]) != len(part_skins):
+            raise ValueError(f"{part} has two skins with the same name")
+
+        # every skin of a part has to color the same pumpkin parts
+        colored_parts = set(part_skins[0]["colors"])
+        for skin in part_skins:
+            if set(skin["colors"]) != colored_parts:
+                raise ValueError(f"{part} skin {skin['name']} colors {sorted(skin['colors'])}, the others color {sorted(colored_parts)}")
+        for pumpkin_part in colored_parts:
+            if pumpkin_part in compiled["part_categories"] or pumpkin_part in compiled["fixed_colors"]:
+                raise ValueError(f"{pumpkin_part} is colored by more than one skin part")
+            compiled["part_categories"][pumpkin_part] = part
+
+    for skin in source["parts"].get("eyes", []):
+        compiled["eye_edges"][skin["name"]] = int(skin["edges"])
+    return compiled
+
+# ==============================================================================
+# loading
+# ==============================================================================
+def load_skins(source_path=default_skin_path):
+    with open(source_path, "rb") as source_file:
+        source_bytes = source_file.read()
+    source_hash = hashlib.sha1(source_bytes).hexdigest()
+
+    cache_path = cache_path_for(source_path)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as cache_file:
+            compiled = json.load(cache_file)
+        if compiled.get("compiler_version") == compiler_version and compiled.get("source_hash") == source_hash:
+            return compiled
+    except (OSError, ValueError):
+        pass # no cache yet or a broken one, compiled again below
+
+    compiled = compile_skins(json.loads(source_bytes), source_hash)
+    try:
+        # written to a temporary file first, a second game starting at the same time never reads half a cache
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as cache_file:
+            json.dump(compiled, cache_file)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass # read only install, the game just compiles again next time
+    return compiled
@@ -0,0 +1,111 @@
+# ==============================================================================
+# headless squash squash
+# ==============================================================================
+# the squash rules without any window, sound or input: where the grid is, which pumpkin is up
+# and whether a click squashed it. squash_squash_game draws a round, replay.py plays recorded
+# rounds through the same rules. times are whole milliseconds and click positions are on a
+# fixed grid, so a recorded round comes out the same every time it's played back
+import random
+
+difficulty_names = ["Easy", "Medium", "Hard"]
+difficulties = [
+    {"rows": 3, "columns": 3, "cell_spacing": 0.40, "spawn_time": 1500},
+    {"rows": 4, "columns": 4, "cell_spacing": 0.35, "spawn_time": 1000},
+    {"rows": 4, "columns": 5, "cell_spacing": 0.30, "spawn_time":  600}
+] # spawn_time in milliseconds
+
+pumpkin_hit_radius  = 0.13  # half of pumpkin_outer_size, same as the drawn shell
+time_resolution     = 1000  # round times are in 1/1000 s
+position_resolution = 16384 # click positions are in 1/16384 norm units
+
+def quantize_time(seconds):
+    return int(round(seconds * time_resolution))
+
+def quantize_position(x, y):
+    # clicks are stored as 16 bit, a norm window is only -1..1 anyway
+    limit = 32767
+    return (max(-limit, min(limit, int(round(x * position_resolution)))),
+            max(-limit, min(limit, int(round(y * position_resolution)))))
+
+# ==============================================================================
+# squash grid index
+# ==============================================================================
+def create_grid_index(grid_rows, grid_columns, cell_spacing, start_x, start_y, hit_radius=pumpkin_hit_radius):
+    return {
+        "rows": grid_rows,
+        "columns": grid_columns,
+        "cell_spacing": cell_spacing,
+        "start_x": start_x,
+        "start_y": start_y,
+        "hit_radius": hit_radius
+    }
+
+def grid_cell_index(grid_index, row, column):
+    # cells are stored row by row, like grid_pumpkins
+    return row * grid_index["columns"] + column
+
+def grid_cell_at(grid_index, x, y):
+    # the cell under (x, y) straight from the grid arithmetic, None outside the grid
+    column = round((x - grid_index["start_x"]) / grid_index["cell_spacing"])
+    row    = round((grid_index["start_y"] - y) / grid_index["cell_spacing"])
+    if 0 <= row < grid_index["rows"] and 0 <= column < grid_index["columns"]:
+        return row, column
+    return None
+
+def grid_hit_test(grid_index, x, y):
+    # returns the cell index if (x, y) is on the pumpkin shell of that cell, otherwise None
+    cell = grid_cell_at(grid_index, x, y)
+    if cell is None:
+        return None
+    row, column = cell
+    center_x = grid_index["start_x"] + column * grid_index["cell_spacing"]
+    center_y = grid_index["start_y"] - row    * grid_index["cell_spacing"]
+    if (x - center_x) ** 2 + (y - center_y) ** 2 > grid_index["hit_radius"] ** 2:
+        return None
+    return grid_cell_index(grid_index, row, column)
+
+def create_difficulty_grid(difficulty):
+    # the grid of a difficulty, centered on the screen
+    settings = difficulties[difficulty]
+    start_x = -( (settings["columns"] - 1) * settings["cell_spacing"] ) / 2
+    start_y = +( (settings["rows"]    - 1) * settings["cell_spacing"] ) / 2
+    return create_grid_index(settings["rows"], settings["columns"], settings["cell_spacing"], start_x, start_y)
+
+# ==============================================================================
+# rounds
+# ==============================================================================
+def create_round(difficulty, total_game_time, seed):
+    # total_game_time in seconds
+    grid_index = create_difficulty_grid(difficulty)
+    return {
+        "grid_index": grid_index,
+        "cell_count": grid_index["rows"] * grid_index["columns"],
+        "spawn_time": difficulties[difficulty]["spawn_time"],
+        "end_time": total_game_time * time_resolution,
+        "rng": random.Random(seed),
+        "active_cell": None,
+        "next_spawn_time": 0,
+        "score": 0
+    }
+
+def advance_round(squash_round, time):
+    # moves the active pumpkin on for every spawn that is due by time
+    while time >= squash_round["next_spawn_time"]:
+        squash_round["active_cell"] = squash_round["rng"].randrange(squash_round["cell_count"])
+        squash_round["next_spawn_time"] += squash_round["spawn_time"]
+
+def click(squash_round, time, x, y):
+    # a click at quantized (x, y), returns True if it squashed the active pumpkin
+    advance_round(squash_round, time)
+    cell = grid_hit_test(squash_round["grid_index"], x / position_resolution, y / position_resolution)
+    if cell is None or cell != squash_round["active_cell"]:
+        return False
+
+    # the next pumpkin comes up right away and stays for a full spawn time
+    squash_round["score"] += 1
+    squash_round["active_cell"] = squash_round["rng"].randrange(squash_round["cell_count"])
+    squash_round["next_spawn_time"] = time + squash_round["spawn_time"]
+    return True
+
+def round_over(squash_round, time):
+    return time >= squash_round["end_time"]